@@ -0,0 +1,147 @@
+import os
+import subprocess
+import threading
+import time
+import webbrowser
+from collections import deque
+
+
+# Everything the desktop commands do to the outside world goes through one
+# of these backends. ACTION_BACKEND=recording (or noop) swaps the real
+# desktop for an in-process double, so the action side of the pipeline runs
+# headless and can be timed.
+
+class DesktopBackend:
+    name = "desktop"
+
+    def __init__(self):
+        self._pyautogui = None
+
+    @property
+    def pyautogui(self):
+        # Imported on first use: pyautogui needs a display at import time
+        if self._pyautogui is None:
+            import pyautogui
+            self._pyautogui = pyautogui
+        return self._pyautogui
+
+    def press(self, key):
+        self.pyautogui.press(key)
+
+    def hotkey(self, *keys):
+        self.pyautogui.hotkey(*keys)
+
+    def scroll(self, clicks):
+        self.pyautogui.scroll(clicks)
+
+    def open_url(self, url):
+        webbrowser.open(url)
+
+    def open_path(self, path):
+        os.startfile(path)
+
+    def popen(self, args, shell=False):
+        subprocess.Popen(args, shell=shell)
+
+    def run(self, args, shell=False, timeout=None):
+        subprocess.run(args, shell=shell, timeout=timeout)
+
+    def system(self, command):
+        os.system(command)
+
+    def grab_screen(self):
+        from PIL import ImageGrab
+        return ImageGrab.grab()
+
+    def makedirs(self, path):
+        os.makedirs(path, exist_ok=True)
+
+    def write_file(self, path, content):
+        with open(path, "w") as f:
+            f.write(content)
+
+
+class NullBackend:
+    name = "noop"
+
+    def _record(self, method, *args):
+        pass
+
+    def press(self, key):
+        self._record("press", key)
+
+    def hotkey(self, *keys):
+        self._record("hotkey", *keys)
+
+    def scroll(self, clicks):
+        self._record("scroll", clicks)
+
+    def open_url(self, url):
+        self._record("open_url", url)
+
+    def open_path(self, path):
+        self._record("open_path", path)
+
+    def popen(self, args, shell=False):
+        self._record("popen", args)
+
+    def run(self, args, shell=False, timeout=None):
+        self._record("run", args)
+
+    def system(self, command):
+        self._record("system", command)
+
+    def grab_screen(self):
+        self._record("grab_screen")
+        return RecordedImage(self)
+
+    def makedirs(self, path):
+        self._record("makedirs", path)
+
+    def write_file(self, path, content):
+        self._record("write_file", path, len(content))
+
+
+class RecordingBackend(NullBackend):
+    name = "recording"
+
+    def __init__(self, maxlen=10000):
+        self.calls = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def _record(self, method, *args):
+        with self._lock:
+            self.calls.append((time.perf_counter(), method, args))
+
+    def clear(self):
+        with self._lock:
+            self.calls.clear()
+
+
+class RecordedImage:
+    # Stand-in for a PIL screenshot from the in-process backends
+    size = (0, 0)
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def save(self, path, *args, **kwargs):
+        self.backend._record("save_image", path)
+
+
+BACKENDS = {
+    "desktop": DesktopBackend,
+    "recording": RecordingBackend,
+    "noop": NullBackend,
+}
+
+_backend = BACKENDS[os.getenv("ACTION_BACKEND", "desktop")]()
+
+
+def get_backend():
+    return _backend
+
+
+def set_backend(backend):
+    global _backend
+    _backend = backend
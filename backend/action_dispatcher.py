@@ -0,0 +1,205 @@
+import asyncio
+import inspect
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class ActionJob:
+    def __init__(self, name, fn, timeout):
+        self.name = name
+        self.fn = fn
+        self.timeout = timeout
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+        self.started_at = None
+        self.coalesced = 0
+
+
+class ActionDispatcher:
+    # Runs desktop actions one at a time on a dedicated worker thread, in
+    # the order they were requested. A request for an action that is still
+    # waiting in the queue, or that was requested less than coalesce_ms
+    # ago, is merged into that earlier request rather than run again.
+    #
+    # An action that times out while still queued is cancelled and never
+    # runs. One that overruns while running gets a "timeout" result and a
+    # fresh worker takes over the queue; the stuck thread exits once its
+    # action returns. At most max_workers threads exist at once, so hung
+    # actions can't pile up threads. Actions that take a timeout argument
+    # (the subprocess ones) are given their budget so they end themselves.
+
+    def __init__(
+        self, actions, timeouts=None, default_timeout=2.0, max_queue=64, max_workers=4,
+        coalesce_ms=150.0
+    ):
+        self.actions = actions
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self.max_workers = max_workers
+        self.coalesce_window = coalesce_ms / 1000
+
+        self._takes_timeout = {
+            name: "timeout" in inspect.signature(fn).parameters
+            for name, fn in actions.items()
+        }
+
+        self._queue = queue.Queue(max_queue)
+        self._pending = {}
+        self._last = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._workers = 0
+
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.cancelled = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+        self._start_worker()
+
+    def _start_worker(self):
+        # Returns False when max_workers threads are already alive
+        with self._lock:
+            if self._workers >= self.max_workers:
+                return False
+            self._workers += 1
+            self._generation += 1
+            generation = self._generation
+
+        threading.Thread(
+            target=self._work, args=(generation,), name=f"actions-{generation}", daemon=True
+        ).start()
+        return True
+
+    def _work(self, generation):
+        while True:
+            job = self._queue.get()
+
+            with self._lock:
+                if self._pending.get(job.name) is job:
+                    del self._pending[job.name]
+
+            # Skip jobs whose caller already gave up on them
+            if not job.future.set_running_or_notify_cancel():
+                continue
+
+            job.started_at = time.perf_counter()
+            try:
+                if self._takes_timeout.get(job.name):
+                    job.fn(timeout=job.timeout)
+                else:
+                    job.fn()
+            except Exception as e:
+                job.future.set_exception(e)
+            else:
+                job.future.set_result(None)
+
+            with self._lock:
+                if generation != self._generation:
+                    self._workers -= 1
+                    return
+
+    def submit(self, name):
+        fn = self.actions.get(name)
+        if fn is None:
+            raise KeyError(name)
+
+        with self._lock:
+            job = self._pending.get(name)
+            if job is None:
+                # Also merge into a recent request that has already run
+                recent = self._last.get(name)
+                if (
+                    recent is not None
+                    and not recent.future.cancelled()
+                    and time.perf_counter() - recent.enqueued_at < self.coalesce_window
+                ):
+                    job = recent
+            if job is not None:
+                job.coalesced += 1
+                self.coalesced += 1
+                return job, True
+
+            job = ActionJob(name, fn, self.timeouts.get(name, self.default_timeout))
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self.rejected += 1
+                raise
+            self._pending[name] = job
+            self._last[name] = job
+
+        return job, False
+
+    async def dispatch(self, name):
+        # Returns a small report dict for the client; never raises
+        try:
+            job, coalesced = self.submit(name)
+        except KeyError:
+            return {"action": name, "status": "unknown"}
+        except queue.Full:
+            return {"action": name, "status": "rejected"}
+
+        if coalesced:
+            return {"action": name, "status": "coalesced"}
+
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job.future)), job.timeout)
+        except asyncio.TimeoutError:
+            # Still queued: drop it so a stale action never fires later
+            if job.future.cancel():
+                with self._lock:
+                    if self._pending.get(name) is job:
+                        del self._pending[name]
+        except Exception:
+            pass
+
+        # Classified from the job itself: one that finished right at the
+        # deadline is a success, not a timeout
+        error = None
+        if job.future.cancelled():
+            status = "cancelled"
+            self.cancelled += 1
+        elif job.future.done():
+            exc = job.future.exception()
+            if exc is None:
+                status = "ok"
+                self.completed += 1
+            else:
+                status, error = "error", str(exc)
+                self.failed += 1
+        else:
+            status = "timeout"
+            self.timed_out += 1
+            # The worker is stuck inside this action; let a new one drain the queue
+            self._start_worker()
+
+        now = time.perf_counter()
+        started = job.started_at if job.started_at is not None else now
+        report = {
+            "action": name,
+            "status": status,
+            "queue_ms": round((started - job.enqueued_at) * 1000, 2),
+            "run_ms": round((now - started) * 1000, 2),
+        }
+        if job.coalesced:
+            report["coalesced"] = job.coalesced
+        if error is not None:
+            report["error"] = error
+        return report
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "cancelled": self.cancelled,
+            "workers": self._workers,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+        }
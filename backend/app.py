@@ -1,33 +1,52 @@
 import os
+import asyncio
+import functools
 import cv2
 import base64
+import json
+import struct
+import threading
 import numpy as np
 from typing import List
 from fastapi import FastAPI, HTTPException, Depends, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
-from pymongo import MongoClient
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 
-from models.model_train import train_user_model, load_user_model, predict
-import mediapipe as mp
+from bson import ObjectId
+from models.storage import get_mongo_client, pack_samples, PACKED_DTYPES
+from models.inference import NumpyMLP, load_inference_model, predict_proba_batch
 from fastapi.middleware.cors import CORSMiddleware
-import threading
 from dotenv import load_dotenv
-import pyautogui
-import subprocess
 import time
 from datetime import datetime
-from backend.commands import *
+from concurrent.futures import ThreadPoolExecutor
+from backend.commands import ACTION_MAP
+from backend.screenshots import writer as screenshot_writer
+from backend.recording import SessionRecorder
+from backend.metrics import (
+    registry, stage_seconds, frames_total, retrain_seconds, retrain_val_accuracy,
+    retrain_low_accuracy_total, actions_total, detections_total, static_frames_total, muted
+)
+from backend.hand_tracker import HandTracker, roi_to_frame
+from backend.frame_diff import FrameChangeDetector
+from backend.hands_pool import HandsPool, PoolBusy
+from backend.frame_slot import LatestFrameSlot, RateController
+from backend.model_cache import ModelCache, model_nbytes
+from backend.retrain_jobs import RetrainQueue, QueueFull, call_by_name
+from backend.batcher import InferenceBatcher
+from backend.gesture_gate import GestureGate
+from backend.action_dispatcher import ActionDispatcher
 # ------------------- Config -------------------
 load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 SECRET_KEY = os.getenv("SECRET_KEY", "CHANGE_THIS_SECRET")
 ALGORITHM = "HS256"
 
-client = MongoClient(MONGO_URI)
+client = get_mongo_client(MONGO_URI)
 db = client["gesture_app"]
 
 users = db["users"]
@@ -35,73 +54,146 @@ gestures = db["gesture_data"]
 models = db["user_models"]
 gesture_action = db["gesture_action_data"]
 
-gestures.create_index([("user_id", 1)])
-gesture_action.create_index([("user_id", 1)])
+# Index plan:
+#   gesture_data (user_id, gesture)   delete_gesture, distinct("gesture"), per-user loads
+#   gesture_data (user_id, batch)     claiming untrained samples, per-batch retrain loads
+#   gesture_action (user_id, gesture) upserts, deletes and action-map loads
+#   user_models (user_id)             model version lookups, loads and saves
+#   users (email)                     signup and login
+# The compound indexes make the old single-field user_id indexes redundant.
+gestures.create_index([("user_id", 1), ("gesture", 1)])
+gestures.create_index([("user_id", 1), ("batch", 1)])
+gesture_action.create_index([("user_id", 1), ("gesture", 1)])
+models.create_index([("user_id", 1)])
+users.create_index([("email", 1)])
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 app = FastAPI()
 security = HTTPBearer()
-model_cache = {}
+model_cache = ModelCache(
+    max_entries=int(os.getenv("MODEL_CACHE_SIZE", "256")),
+    max_bytes=int(os.getenv("MODEL_CACHE_MAX_MB", "256")) * 1024 * 1024,
+    ttl=float(os.getenv("MODEL_CACHE_TTL", "3600"))
+)
 
-mp_hands = mp.solutions.hands
+HANDS_POOL_SIZE = int(os.getenv("HANDS_POOL_SIZE", os.cpu_count() or 1))
+HANDS_POOL_MAX_WAITING = int(os.getenv("HANDS_POOL_MAX_WAITING", HANDS_POOL_SIZE * 4))
+HANDS_POOL_TIMEOUT = float(os.getenv("HANDS_POOL_TIMEOUT", "1.0"))
+# Give each prediction socket its own detector for tracking continuity
+HANDS_PER_SESSION = os.getenv("HANDS_PER_SESSION", "0") == "1"
 
-hands = mp_hands.Hands(
+hands_pool = HandsPool(
+    HANDS_POOL_SIZE,
+    max_waiting=HANDS_POOL_MAX_WAITING,
+    timeout=HANDS_POOL_TIMEOUT,
     static_image_mode=False,
     max_num_hands=1,
     min_detection_confidence=0.5,
     min_tracking_confidence=0.5
 )
 
-hands_lock = threading.Lock()
-
-ACTION_MAP = {
-    "Volume Up": volume_up,
-    "Volume Down": volume_down,
-    "Mute": mute,
-    "Unmute": unmute,
-    "Play Media": play_media,
-    "Pause Media": pause_media,
-    "Next Track": next_track,
-    "Previous Track": previous_track,
-    "Screenshot": screenshot,
-    "Lock Screen": lock_screen,
-    "Minimize All Windows": minimize_all_windows,
-    "Maximize Current Window": maximize_current_window,
-    "Minimize Current Window": minimize_current_window,
-
-    "New Tab": new_tab,
-    "Close Tab": close_tab,
-    "Reopen Closed Tab": reopen_closed_tab,
-    "Refresh Page": refresh_page,
-    "Scroll Up": scroll_up,
-    "Scroll Down": scroll_down,
-    "Zoom In": zoom_in,
-    "Zoom Out": zoom_out,
-    "Open YouTube": open_youtube,
-    "Open ChatGPT": open_chatgpt,
-
-    "Open VS Code": open_vscode,
-    "Open Terminal": open_terminal,
-    "Run Code": run_code,
-    "Git Pull": git_pull,
-    "Git Push": git_push,
-    "Create HTML Project": create_html_template,
-    "Create React Component": create_react_component,
-    "Create Node API": create_node_api_template,
-    "Create README.md": create_readme,
-
-    "Create New Folder": create_new_folder,
-    "Rename Selected File": rename_selected_file,
-    "Delete Selected File": delete_selected_file,
-    "Open Downloads": open_downloads,
-    "Open Documents": open_documents,
-    "Open Desktop": open_desktop,
-
-    "Presentation Mode": presentation_mode,
-    "Meeting Mode": meeting_mode,
-    "Study Mode": study_mode,
-    "Focus Mode": focus_mode,
+# Blocking per-frame work (decode, MediaPipe, torch) runs on this pool so a
+# slow frame never stalls the event loop; Mongo calls get their own pool so
+# they can't starve inference.
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", HANDS_POOL_SIZE))
+INFERENCE_MAX_PENDING = int(os.getenv("INFERENCE_MAX_PENDING", INFERENCE_WORKERS * 2))
+IO_WORKERS = int(os.getenv("IO_WORKERS", "8"))
+
+inference_executor = ThreadPoolExecutor(INFERENCE_WORKERS, thread_name_prefix="inference")
+io_executor = ThreadPoolExecutor(IO_WORKERS, thread_name_prefix="io")
+inference_slots = asyncio.Semaphore(INFERENCE_MAX_PENDING)
+
+# Landmark vectors from all sockets are gathered for up to BATCH_WINDOW_MS and
+# run as one forward pass per user model. NumPy models run inline on the
+# loop; legacy torch models go to the inference pool.
+batcher = InferenceBatcher(
+    predict_proba_batch,
+    inference_executor,
+    window_ms=float(os.getenv("BATCH_WINDOW_MS", "2")),
+    max_batch=int(os.getenv("BATCH_MAX_SIZE", "64")),
+    run_inline=lambda model: isinstance(model, NumpyMLP)
+)
+
+# Seconds a cached gesture->action map is trusted before it is reloaded, which
+# bounds staleness when another worker process changed the mapping
+ACTION_MAP_TTL = float(os.getenv("ACTION_MAP_TTL", "30"))
+
+# Same LRU as the models, so idle users' maps are evicted
+action_map_cache = ModelCache(
+    max_entries=int(os.getenv("ACTION_MAP_CACHE_SIZE", "1024")),
+    ttl=ACTION_MAP_TTL
+)
+# Bumped by every invalidation; a load that overlapped one isn't cached,
+# since it may have read the mapping from before the change
+action_map_generation = 0
+action_map_lock = threading.Lock()
+
+# An action fires only when its gesture is this confident for
+# GESTURE_AGREE_FRAMES frames in a row (or, if GESTURE_EMA_ALPHA is set, when
+# the smoothed probability is), and not within its cooldown
+GESTURE_MIN_CONFIDENCE = float(os.getenv("GESTURE_MIN_CONFIDENCE", "0.8"))
+GESTURE_AGREE_FRAMES = int(os.getenv("GESTURE_AGREE_FRAMES", "3"))
+GESTURE_COOLDOWN_S = float(os.getenv("GESTURE_COOLDOWN_S", "1.0"))
+GESTURE_EMA_ALPHA = float(os.environ["GESTURE_EMA_ALPHA"]) if os.getenv("GESTURE_EMA_ALPHA") else None
+
+# When set, every prediction session's incoming frames are recorded here for
+# replay with benchmarks/replay.py
+RECORD_DIR = os.getenv("RECORD_DIR")
+
+MIN_FRAME_INTERVAL_MS = int(os.getenv("MIN_FRAME_INTERVAL_MS", "50"))
+MAX_FRAME_INTERVAL_MS = int(os.getenv("MAX_FRAME_INTERVAL_MS", "1000"))
+
+# Seconds the prediction socket waits for an action before reporting a timeout
+ACTION_TIMEOUTS = {
+    "Screenshot": 5.0,
+    "Git Pull": 30.0,
+    "Git Push": 30.0,
+    "Focus Mode": 10.0,
+    "Meeting Mode": 5.0,
+    "Study Mode": 5.0,
 }
+
+action_dispatcher = ActionDispatcher(
+    ACTION_MAP,
+    timeouts=ACTION_TIMEOUTS,
+    default_timeout=float(os.getenv("ACTION_TIMEOUT_S", "2")),
+    max_queue=int(os.getenv("ACTION_QUEUE_SIZE", "64")),
+    max_workers=int(os.getenv("ACTION_MAX_WORKERS", "4")),
+    coalesce_ms=float(os.getenv("ACTION_COALESCE_MS", "150"))
+)
+# Per-stage pipeline timings, exposed on /metrics
+STAGE_RECEIVE = stage_seconds.labels("receive")
+STAGE_QUEUE = stage_seconds.labels("frame_queue")
+STAGE_BASE64 = stage_seconds.labels("base64_decode")
+STAGE_IMDECODE = stage_seconds.labels("imdecode")
+STAGE_HANDS_WAIT = stage_seconds.labels("hands_wait")
+STAGE_HANDS = stage_seconds.labels("hands_process")
+STAGE_LANDMARKS = stage_seconds.labels("landmarks")
+STAGE_PREDICT = stage_seconds.labels("predict")
+STAGE_ACTION_LOOKUP = stage_seconds.labels("action_lookup")
+STAGE_ACTION_QUEUE = stage_seconds.labels("action_queue")
+STAGE_ACTION_RUN = stage_seconds.labels("action_run")
+STAGE_FRAME = stage_seconds.labels("frame_total")
+# Whole /save_frame landmark extraction; its inner stages aren't recorded so
+# full-resolution training decodes don't skew the prediction stages
+STAGE_CAPTURE = stage_seconds.labels("capture_landmarks")
+
+FRAMES_HAND = frames_total.labels("hand")
+FRAMES_NO_HAND = frames_total.labels("no_hand")
+FRAMES_DROPPED = frames_total.labels("dropped")
+FRAMES_ERROR = frames_total.labels("error")
+FRAMES_BUSY = frames_total.labels("busy")
+
+DETECTIONS_ROI = detections_total.labels("roi")
+DETECTIONS_FULL = detections_total.labels("full")
+FRAMES_STATIC = static_frames_total.labels()
+
+registry.collect_stats("gesture_hands_pool", hands_pool.stats)
+registry.collect_stats("gesture_model_cache", model_cache.stats)
+registry.collect_stats("gesture_action_map_cache", action_map_cache.stats)
+registry.collect_stats("gesture_batcher", batcher.stats)
+registry.collect_stats("gesture_actions", action_dispatcher.stats)
+registry.collect_stats("gesture_screenshots", screenshot_writer.stats)
 # ------------------- CORS -------------------
 app.add_middleware(
     CORSMiddleware,
@@ -123,7 +215,9 @@ class Login(BaseModel):
 class Frame(BaseModel):
     gesture_name: str
     action: str
-    features: List[str]
+    features: List[str] = []
+    # Already-extracted hand landmarks, 21x3 or flat 63 floats per frame
+    landmarks: List[list] = []
 
 class DeleteGesture(BaseModel):
     gesture_name: str
@@ -152,63 +246,390 @@ def get_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
 
 
 # ------------------- Utilities -------------------
-def base64_to_landmarks(dataURL: str):
-    try:
-        if not dataURL or "," not in dataURL:
-            return None
+# Binary frames on /ws/predict carry either an encoded image (JPEG/PNG bytes,
+# handed straight to cv2.imdecode) or a raw pixel buffer prefixed by this
+# header: width, height, pixel format, 3 reserved bytes.
+RAW_HEADER = struct.Struct("<HHB3x")
+
+RAW_RGB = 0
+RAW_BGR = 1
+RAW_I420 = 2
+RAW_NV12 = 3
+
+# "landmarks" clients run hand detection locally and send 63 packed
+# little-endian float32 values per binary message
+FRAME_FORMATS = ("encoded", "raw", "landmarks")
+
+# Prediction frames are decoded at 1/DECODE_REDUCTION scale. Landmarks are
+# normalized to the image, so they are unaffected; /save_frame keeps full
+# resolution for training captures.
+DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+DECODE_REDUCTION = int(os.getenv("DECODE_REDUCTION", "2"))
+if DECODE_REDUCTION not in DECODE_FLAGS:
+    raise ValueError(f"DECODE_REDUCTION must be one of {sorted(DECODE_FLAGS)}, got {DECODE_REDUCTION}")
+# Padding around the last hand box, as a fraction of its size, for ROI detection
+TRACKER_PAD = float(os.getenv("TRACKER_PAD", "0.35"))
+# A frame whose thumbnail is within STATIC_THRESHOLD gray levels (mean absolute
+# difference) of the last processed one reuses its landmarks and prediction;
+# 0 disables the check. Detection still runs every STATIC_MAX_SKIP frames.
+STATIC_THRESHOLD = float(os.getenv("STATIC_THRESHOLD", "2.0"))
+STATIC_MAX_SKIP = int(os.getenv("STATIC_MAX_SKIP", "30"))
+
+LANDMARK_SHAPE = (21, 3)
+LANDMARK_SIZE = 63
+
+
+def decode_data_url(dataURL: str):
+    if not dataURL or "," not in dataURL:
+        return None
 
+    with STAGE_BASE64.time():
         header, encoded = dataURL.split(",", 1)
-        encoded = encoded.strip()
+        return base64.b64decode(encoded.strip())
 
-        img_bytes = base64.b64decode(encoded)
-        nparr = np.frombuffer(img_bytes, np.uint8)
 
-        if len(nparr) == 0:
-            return None
+def bytes_to_image(buf, reduction=1):
+    # np.frombuffer is a view over the websocket payload, no copy
+    nparr = np.frombuffer(buf, np.uint8)
+
+    if len(nparr) == 0:
+        return None
 
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    with STAGE_IMDECODE.time():
+        # JPEG decodes straight to 1/2, 1/4 or 1/8 scale with these flags
+        img = cv2.imdecode(nparr, DECODE_FLAGS[reduction])
 
         if img is None:
             return None
 
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+def raw_to_image(buf):
+    if len(buf) < RAW_HEADER.size:
+        return None
+
+    width, height, pixel_format = RAW_HEADER.unpack_from(buf)
+    offset = RAW_HEADER.size
 
-        with hands_lock:
+    if pixel_format in (RAW_RGB, RAW_BGR):
+        shape = (height, width, 3)
+    elif pixel_format in (RAW_I420, RAW_NV12):
+        shape = (height * 3 // 2, width)
+    else:
+        return None
+
+    count = shape[0] * shape[1] * (shape[2] if len(shape) == 3 else 1)
+    if len(buf) - offset != count:
+        return None
+
+    img = np.frombuffer(buf, np.uint8, count=count, offset=offset).reshape(shape)
+
+    if pixel_format == RAW_RGB:
+        return img
+
+    with STAGE_IMDECODE.time():
+        if pixel_format == RAW_BGR:
+            return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        if pixel_format == RAW_I420:
+            return cv2.cvtColor(img, cv2.COLOR_YUV2RGB_I420)
+        return cv2.cvtColor(img, cv2.COLOR_YUV2RGB_NV12)
+
+
+def detect_hand(img, hands=None):
+    if hands is None:
+        waited = time.perf_counter()
+        with hands_pool.lease() as hands:
+            STAGE_HANDS_WAIT.observe(time.perf_counter() - waited)
+            with STAGE_HANDS.time():
+                result = hands.process(img)
+    else:
+        with STAGE_HANDS.time():
             result = hands.process(img)
 
-        if not result.multi_hand_landmarks:
+    if not result.multi_hand_landmarks:
+        return None
+
+    hand_landmarks = result.multi_hand_landmarks[0]
+
+    return np.array([[lm.x, lm.y, lm.z] for lm in hand_landmarks.landmark])
+
+
+def image_to_landmarks(img, hands=None, tracker=None, motion=None):
+    if motion is None:
+        return detect_landmarks(img, hands, tracker)
+
+    # Same scene as the last processed frame: skip detection entirely
+    thumb = motion.thumbnail(img)
+    if motion.matches(thumb):
+        FRAMES_STATIC.inc()
+        return motion.landmarks
+
+    landmarks = detect_landmarks(img, hands, tracker)
+    motion.remember(thumb, landmarks)
+    return landmarks
+
+
+def detect_landmarks(img, hands=None, tracker=None):
+    x = None
+
+    # Search a padded crop around last frame's hand before the whole frame
+    if tracker is not None and tracker.box is not None:
+        height, width = img.shape[:2]
+        box = tracker.pixel_box(width, height)
+        x0, y0, x1, y1 = box
+
+        DETECTIONS_ROI.inc()
+        try:
+            x = detect_hand(np.ascontiguousarray(img[y0:y1, x0:x1]), hands)
+        except PoolBusy:
+            raise
+        except Exception as e:
+            # A bad crop must not stick: drop the box and search the full frame
+            print("ROI detection error:", e)
+            tracker.reset()
+            x = None
+        if x is not None:
+            x = roi_to_frame(x, box, width, height)
+
+    if x is None:
+        DETECTIONS_FULL.inc()
+        x = detect_hand(img, hands)
+
+    if tracker is not None:
+        if x is None:
+            tracker.reset()
+        else:
+            tracker.update(x)
+
+    if x is None:
+        return None
+
+    # Normalize (translation only)
+    wrist = x[0]
+    x = x - wrist
+
+    return x.tolist()
+
+
+def normalize_landmarks(x):
+    if x.size != LANDMARK_SIZE:
+        return None
+
+    x = x.reshape(LANDMARK_SHAPE)
+
+    if not np.isfinite(x).all():
+        return None
+
+    # Same translation-only normalization as server-side detection
+    return (x - x[0]).tolist()
+
+
+def values_to_landmarks(values):
+    try:
+        return normalize_landmarks(np.asarray(values, dtype=np.float32))
+    except (TypeError, ValueError):
+        return None
+
+
+def packed_to_landmarks(buf):
+    if len(buf) != LANDMARK_SIZE * 4:
+        return None
+
+    return normalize_landmarks(np.frombuffer(buf, "<f4"))
+
+
+def base64_to_landmarks(dataURL: str, hands=None, tracker=None, reduction=1, motion=None):
+    try:
+        img_bytes = decode_data_url(dataURL)
+        if img_bytes is None:
             return None
 
-        hand_landmarks = result.multi_hand_landmarks[0]
+        img = bytes_to_image(img_bytes, reduction)
+        if img is None:
+            return None
+
+        return image_to_landmarks(img, hands, tracker, motion)
+
+    except PoolBusy:
+        # Backpressure, not bad input: let the caller tell the client
+        raise
+    except Exception as e:
+        FRAMES_ERROR.inc()
+        print("Landmark error:", e)
+        return None
+
 
-        x = np.array([[lm.x, lm.y, lm.z] for lm in hand_landmarks.landmark])
+def binary_to_landmarks(
+    buf, frame_format="encoded", hands=None, tracker=None, reduction=1, motion=None
+):
+    if frame_format == "landmarks":
+        return packed_to_landmarks(buf)
+
+    try:
+        if frame_format == "raw":
+            img = raw_to_image(buf)
+        else:
+            img = bytes_to_image(buf, reduction)
 
-        # Normalize (translation only)
-        wrist = x[0]
-        x = x - wrist
+        if img is None:
+            return None
 
-        return x.tolist()
+        return image_to_landmarks(img, hands, tracker, motion)
 
+    except PoolBusy:
+        # Backpressure, not bad input: let the caller tell the client
+        raise
     except Exception as e:
+        FRAMES_ERROR.inc()
         print("Landmark error:", e)
         return None
 
 
+def frame_to_landmarks(
+    frame_bytes, data, frame_format, hands=None, tracker=None, reduction=1, motion=None
+):
+    if motion is not None:
+        motion.static = False
+    if frame_bytes is not None:
+        return binary_to_landmarks(frame_bytes, frame_format, hands, tracker, reduction, motion)
+    if "landmarks" in data:
+        return values_to_landmarks(data["landmarks"])
+    return base64_to_landmarks(data.get("frame"), hands, tracker, reduction, motion)
 
 
-def augment_landmarks(x):
-    x = np.array(x)
-    noise = np.random.normal(0, 0.003, x.shape)
-    x = x + noise
+def load_torch_model(**kwargs):
+    # Only models trained before the NumPy export need torch; it is imported
+    # here, on first use, so the server doesn't load it otherwise
+    from models.model_train import load_user_model
+    return load_user_model(**kwargs)
 
-    theta = np.random.uniform(-5, 5) * np.pi / 180
-    R = np.array([
-        [np.cos(theta), -np.sin(theta)],
-        [np.sin(theta),  np.cos(theta)]
-    ])
-    x[:, :2] = x[:, :2] @ R.T
 
-    return x.tolist()
+def load_action_map(user_id: str):
+    generation = action_map_generation
+
+    actions = {}
+    for doc in gesture_action.find({"user_id": user_id}, {"_id": 0, "gesture": 1, "action": 1}):
+        if doc.get("action") in ACTION_MAP:
+            actions[doc["gesture"]] = doc["action"]
+
+    with action_map_lock:
+        if generation == action_map_generation:
+            action_map_cache.put(user_id, None, actions)
+    return actions
+
+
+def cached_action_map(user_id: str):
+    return action_map_cache.get(user_id, None)
+
+
+def invalidate_action_map(user_id: str):
+    global action_map_generation
+    with action_map_lock:
+        action_map_generation += 1
+        action_map_cache.invalidate(user_id)
+
+
+async def run_blocking(executor, fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+
+async def run_inference(fn, *args, **kwargs):
+    # Bounds how many frames can be queued on the inference pool at once
+    async with inference_slots:
+        return await run_blocking(inference_executor, fn, *args, **kwargs)
+
+
+async def report_action(websocket: WebSocket, action: str):
+    # Actions run on the dispatcher; the result is sent whenever it finishes
+    report = await action_dispatcher.dispatch(action)
+
+    actions_total.labels(report["status"]).inc()
+    if "run_ms" in report:
+        STAGE_ACTION_QUEUE.observe(report["queue_ms"] / 1000)
+        STAGE_ACTION_RUN.observe(report["run_ms"] / 1000)
+    try:
+        await websocket.send_json(report)
+    except (RuntimeError, WebSocketDisconnect):
+        pass
+
+
+async def receive_frame(websocket: WebSocket):
+    # Accepts both the legacy {"frame": dataURL} text message and binary frames
+    message = await websocket.receive()
+
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+
+    if message.get("bytes") is not None:
+        return message["bytes"], None
+
+    with STAGE_RECEIVE.time():
+        data = json.loads(message.get("text") or "{}")
+    return None, data
+
+
+async def pump_frames(websocket: WebSocket, slot: LatestFrameSlot, recorder=None):
+    # Drains the socket as fast as frames arrive; only the newest is kept
+    try:
+        while True:
+            frame_bytes, data = await receive_frame(websocket)
+
+            if frame_bytes is None and not (data.get("frame") or "landmarks" in data):
+                continue
+
+            if recorder is not None:
+                recorder.record(frame_bytes, data)
+
+            if slot.put((frame_bytes, data, time.perf_counter())):
+                FRAMES_DROPPED.inc()
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    except json.JSONDecodeError as e:
+        print("Bad frame message:", e)
+    finally:
+        slot.close()
+
+
+AUGMENT_COPIES = 5
+TRAIN_BATCH_SIZE = int(os.getenv("TRAIN_BATCH_SIZE", "32"))
+# Retrains run in separate worker processes, capped in number and in torch
+# threads each, so training can't starve live prediction
+RETRAIN_WORKERS = int(os.getenv("RETRAIN_WORKERS", "1"))
+RETRAIN_TORCH_THREADS = int(os.getenv("RETRAIN_TORCH_THREADS", "2"))
+RETRAIN_MAX_PENDING = int(os.getenv("RETRAIN_MAX_PENDING", "32"))
+RETRAIN_TIME_BUDGET_S = float(os.getenv("RETRAIN_TIME_BUDGET_S", "60"))
+RETRAIN_MIN_VAL_ACCURACY = float(os.getenv("RETRAIN_MIN_VAL_ACCURACY", "0.8"))
+
+# "list" keeps one nested-list document per sample; "float32"/"float16" store
+# a whole capture as one packed document
+GESTURE_STORAGE = os.getenv("GESTURE_STORAGE", "list")
+
+
+def augment_landmarks(x, copies=AUGMENT_COPIES):
+    # x: (N, 21, 3) -> (N, copies, 21, 3), all samples in one pass
+    x = np.asarray(x, dtype=np.float64)
+    n = x.shape[0]
+
+    out = np.repeat(x[:, None], copies, axis=1)
+    out += np.random.normal(0, 0.003, out.shape)
+
+    theta = np.random.uniform(-5, 5, (n, copies)) * np.pi / 180
+    cos, sin = np.cos(theta), np.sin(theta)
+    # Rotation transposed, so row vectors can be multiplied on the left
+    R_T = np.stack([
+        np.stack([cos, sin], axis=-1),
+        np.stack([-sin, cos], axis=-1)
+    ], axis=-2)
+    out[..., :2] = out[..., :2] @ R_T
+
+    return out
 
 
 # ------------------- HTTP Endpoints -------------------
@@ -240,62 +661,126 @@ def login(data: Login):
 def save_frame(data: Frame, user_id: str = Depends(get_user)):
     processed = []
 
-    for f in data.features:
-        lm = base64_to_landmarks(f)
+    try:
+        with STAGE_CAPTURE.time(), muted():
+            for f in data.features:
+                lm = base64_to_landmarks(f)
+                if lm is not None:
+                    processed.append(lm)
+    except PoolBusy:
+        raise HTTPException(status_code=503, detail="Hand detector busy, try again")
+
+    for values in data.landmarks:
+        lm = values_to_landmarks(values)
         if lm is not None:
             processed.append(lm)
 
     if len(processed) == 0:
         raise HTTPException(status_code=400, detail="No valid hand detected")
 
-    total_saved = 0
+    x = np.asarray(processed, dtype=np.float64)
+    aug = augment_landmarks(x)
+
+    # Each original followed by its augmented copies, written in one round-trip
+    samples = np.concatenate([x[:, None], aug], axis=1).reshape(-1, *LANDMARK_SHAPE)
+
+    # Frames of one capture are near-duplicates, and the augmented copies
+    # more so; training keeps a capture on one side of its validation split
+    capture_id = ObjectId()
 
-    for lm in processed:
+    if GESTURE_STORAGE in PACKED_DTYPES:
         gestures.insert_one({
             "user_id": user_id,
             "gesture": data.gesture_name,
-            "features": lm
+            "capture_id": capture_id,
+            **pack_samples(samples, GESTURE_STORAGE)
         })
-        total_saved += 1
-
-        for _ in range(5):
-            aug = augment_landmarks(lm)
-            gestures.insert_one({
+    else:
+        gestures.insert_many([
+            {
                 "user_id": user_id,
                 "gesture": data.gesture_name,
-                "features": aug
-            })
-            total_saved += 1
+                "capture_id": capture_id,
+                "features": features
+            }
+            for features in samples.tolist()
+        ], ordered=False)
+    total_saved = len(samples)
 
     gesture_action.update_one(
         {"user_id": user_id, "gesture": data.gesture_name},
         {"$set": {"action": data.action}},
         upsert=True
     )
+    invalidate_action_map(user_id)
 
     return {"message": f"{total_saved} frames saved"}
 
 
-@app.post("/retrain_model")
-def retrain_model(user_id: str = Depends(get_user)):
-    count=gestures.count_documents({"user_id":user_id})
-    if (count==0):
-        raise HTTPException(400)
+def retrain_finished(job):
+    # Called in the server process once a worker finishes a retrain
+    if job.status != "done":
+        print(f"Retrain for {job.user_id} failed: {job.error}")
+        return
+
+    model_cache.invalidate(job.user_id)
+
+    mode = "incremental" if job.metrics.get("incremental") else "full"
+    duration = job.finished_at - (job.started_at or job.created_at)
+    retrain_seconds.labels(mode).observe(duration)
+    print(f"Retrained model for {job.user_id} in {duration:.2f}s")
 
-    print('Request Reached')
+    val_accuracy = job.metrics.get("val_accuracy")
+    if val_accuracy is not None:
+        retrain_val_accuracy.labels(mode).observe(val_accuracy)
+        if val_accuracy < RETRAIN_MIN_VAL_ACCURACY:
+            retrain_low_accuracy_total.labels(mode).inc()
+            print(f"WARNING: model for {job.user_id} has low validation accuracy {val_accuracy:.3f}")
 
-    model, classes = train_user_model(
+
+retrain_queue = RetrainQueue(
+    # Named rather than imported so torch is only loaded in the workers
+    functools.partial(
+        call_by_name,
+        "models.model_train:retrain_job",
         mongo_uri=MONGO_URI,
         db_name="gesture_app",
         gesture_collection_name="gesture_data",
         model_collection_name="user_models",
-        user_id=user_id
-    )
+        batch_size=TRAIN_BATCH_SIZE,
+        max_seconds=RETRAIN_TIME_BUDGET_S
+    ),
+    max_workers=RETRAIN_WORKERS,
+    max_pending=RETRAIN_MAX_PENDING,
+    on_finished=retrain_finished,
+    initializer=functools.partial(call_by_name, "models.model_train:limit_threads"),
+    initargs=(RETRAIN_TORCH_THREADS,)
+)
+
+
+@app.post("/retrain_model")
+def retrain_model(full: bool = False, user_id: str = Depends(get_user)):
+    count=gestures.count_documents({"user_id":user_id})
+    if (count==0):
+        raise HTTPException(400)
+
+    try:
+        # Warm-start from the stored model unless a full retrain is asked for
+        job = retrain_queue.submit(user_id, incremental=not full)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    return job.to_dict()
+
 
-    model_cache.pop(user_id, None)
+@app.get("/retrain_status/{job_id}")
+def retrain_status(job_id: str, user_id: str = Depends(get_user)):
+    job = retrain_queue.get(job_id)
 
-    return {"message": "Model trained", "classes": classes}
+    if job is None or job.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
 
+    return job.to_dict()
 
 
 @app.post("/delete_gesture")
@@ -309,6 +794,7 @@ def delete_gesture(data: DeleteGesture, user_id: str = Depends(get_user)):
         "user_id": user_id,
         "gesture": data.gesture_name
     })
+    invalidate_action_map(user_id)
 
     return {"response": "Gesture deleted. Retrain model."}
 
@@ -322,19 +808,53 @@ def extract_action_map(user_id: str = Depends(get_user)):
     return {"map": data}
 
 
-# ------------------- WebSocket Prediction -------------------
+@app.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stats/hands_pool")
+def hands_pool_stats():
+    return hands_pool.stats()
+
+
+@app.get("/stats/model_cache")
+def model_cache_stats():
+    return model_cache.stats()
+
+
+@app.get("/stats/batcher")
+def batcher_stats():
+    return batcher.stats()
+
+
+@app.get("/stats/actions")
+def action_stats():
+    return action_dispatcher.stats()
+
+
+@app.get("/stats/screenshots")
+def screenshot_stats():
+    return screenshot_writer.stats()
+
+
 # ------------------- WebSocket Prediction -------------------
 @app.websocket("/ws/predict")
 async def websocket_predict(websocket: WebSocket):
 
     await websocket.accept()
 
+    session_hands = None
+    reader = None
+    recorder = None
+
     try:
         # --- Receive token first ---
         auth_data = await websocket.receive_json()
         token = auth_data.get("token")
+        frame_format = auth_data.get("frame_format", "encoded")
 
-        if not token:
+        if not token or frame_format not in FRAME_FORMATS:
             await websocket.close(code=1008)
             return
 
@@ -346,59 +866,157 @@ async def websocket_predict(websocket: WebSocket):
             return
 
         # -------- Model Caching --------
-        if user_id not in model_cache:
-            model, classes = load_user_model(
-                mongo_uri=MONGO_URI,
-                db_name="gesture_app",
-                model_collection_name="user_models",
-                user_id=user_id
+        version_doc = await run_blocking(
+            io_executor,
+            models.find_one,
+            {"user_id": user_id},
+            {"updated_at": 1}
+        )
+
+        if not version_doc:
+            await websocket.send_json({"error": "Model not trained"})
+            await websocket.close()
+            return
+
+        version = version_doc.get("updated_at")
+        cached = model_cache.get(user_id, version)
+
+        if cached is None:
+            # Prefer the exported NumPy model; older models only have the torch checkpoint
+            model, classes = await run_blocking(
+                io_executor, load_inference_model, models, user_id
             )
 
+            if model is None:
+                model, classes = await run_blocking(
+                    io_executor,
+                    load_torch_model,
+                    mongo_uri=MONGO_URI,
+                    db_name="gesture_app",
+                    model_collection_name="user_models",
+                    user_id=user_id,
+                    model_collection=models
+                )
+
             if not model:
                 await websocket.send_json({"error": "Model not trained"})
                 await websocket.close()
                 return
 
-            model_cache[user_id] = (model, classes)
+            cached = (model, classes)
+            model_cache.put(user_id, version, cached, model_nbytes(model))
 
-        model, classes = model_cache[user_id]
+        model, classes = cached
         # --------------------------------
 
-        last_executed_gesture = None  # 🔥 IMPORTANT
+        if HANDS_PER_SESSION and frame_format != "landmarks":
+            try:
+                session_hands = await run_blocking(io_executor, hands_pool.acquire)
+            except PoolBusy:
+                await websocket.close(code=1013)
+                return
+
+        await websocket.send_json({"status": "ready", "frame_format": frame_format})
+
+        gate = GestureGate(
+            len(classes),
+            min_confidence=GESTURE_MIN_CONFIDENCE,
+            agree_frames=GESTURE_AGREE_FRAMES,
+            cooldown_s=GESTURE_COOLDOWN_S,
+            ema_alpha=GESTURE_EMA_ALPHA
+        )
+
+        tracker = HandTracker(pad=TRACKER_PAD)
+        motion = None
+        if STATIC_THRESHOLD > 0 and frame_format != "landmarks":
+            motion = FrameChangeDetector(STATIC_THRESHOLD, max_skip=STATIC_MAX_SKIP)
+        last_probs = None
+
+        slot = LatestFrameSlot()
+        rate = RateController(MIN_FRAME_INTERVAL_MS, MAX_FRAME_INTERVAL_MS)
+        if RECORD_DIR:
+            recorder = SessionRecorder(
+                os.path.join(RECORD_DIR, f"{user_id}_{int(time.time() * 1000)}.grec"),
+                frame_format
+            )
+
+        reader = asyncio.create_task(pump_frames(websocket, slot, recorder))
 
         # -------- Prediction Loop --------
         while True:
-            data = await websocket.receive_json()
-            frame_base64 = data.get("frame")
-
-            if not frame_base64:
+            frame_bytes, data, received_at = await slot.get()
+            started = time.perf_counter()
+            STAGE_QUEUE.observe(started - received_at)
+
+            try:
+                landmarks = await run_inference(
+                    frame_to_landmarks,
+                    frame_bytes, data, frame_format, session_hands, tracker, DECODE_REDUCTION, motion
+                )
+            except PoolBusy:
+                # Detectors are saturated: ask the client to slow down and
+                # leave the gate alone, since nothing was learned about the hand
+                FRAMES_BUSY.inc()
+                rate.backoff()
+                await websocket.send_json({
+                    "status": "busy",
+                    "dropped": slot.dropped,
+                    "interval_ms": rate.interval_ms()
+                })
                 continue
-
-            landmarks = base64_to_landmarks(frame_base64)
-
-            if landmarks is None:
-                last_executed_gesture = None
-                await websocket.send_json({"prediction": "no_hand"})
+            STAGE_LANDMARKS.observe(time.perf_counter() - started)
+
+            probs = None
+            if landmarks is not None:
+                if motion is not None and motion.static and last_probs is not None:
+                    probs = last_probs
+                else:
+                    with STAGE_PREDICT.time():
+                        probs = await batcher.predict_proba(model, landmarks)
+            last_probs = probs
+
+            rate.observe((time.perf_counter() - started) * 1000)
+            status = {"dropped": slot.dropped, "interval_ms": rate.interval_ms()}
+
+            if probs is None:
+                gate.reset()
+                FRAMES_NO_HAND.inc()
+                STAGE_FRAME.observe(time.perf_counter() - started)
+                await websocket.send_json({"prediction": "no_hand", **status})
                 continue
 
+            idx, confidence, fire = gate.update(probs, time.monotonic())
+            prediction = classes[idx]
 
-            prediction = predict(model, classes, landmarks)
+            # Only execute once a gesture is confident, stable and off cooldown
+            if fire:
 
-            # Only execute if gesture changed
-            if prediction != last_executed_gesture:
+                with STAGE_ACTION_LOOKUP.time():
+                    actions = cached_action_map(user_id)
+                    if actions is None:
+                        actions = await run_blocking(io_executor, load_action_map, user_id)
 
-                action_doc = gesture_action.find_one(
-                    {"user_id": user_id, "gesture": prediction}
-                )
-                
-                if action_doc:
-                    finalaction = action_doc.get("action")
-                    ACTION_MAP[finalaction]()
+                action = actions.get(prediction)
+                if action is not None:
+                    asyncio.create_task(report_action(websocket, action))
 
-                last_executed_gesture = prediction
+            FRAMES_HAND.inc()
+            STAGE_FRAME.observe(time.perf_counter() - started)
 
-            await websocket.send_json({"prediction": prediction})
+            await websocket.send_json({
+                "prediction": prediction,
+                "confidence": round(confidence, 3),
+                **status
+            })
 
     except WebSocketDisconnect:
         print("WebSocket disconnected")
 
+    finally:
+        if reader is not None:
+            reader.cancel()
+        if recorder is not None:
+            recorder.close()
+        if session_hands is not None:
+            hands_pool.release(session_hands)
+
@@ -0,0 +1,88 @@
+import asyncio
+
+
+class InferenceBatcher:
+    # Micro-batches predictions across prediction sockets. Requests that
+    # arrive within `window_ms` of the first one (or until `max_batch` is
+    # reached) are grouped by model and run as one forward pass per model.
+    # Models for which run_inline(model) is true (cheap NumPy forward passes)
+    # run right on the event loop; only the rest hop to `executor`, so a
+    # microsecond matmul never queues behind hand detection.
+
+    def __init__(self, predict_proba_batch, executor, window_ms=2.0, max_batch=64, run_inline=None):
+        self.predict_proba_batch = predict_proba_batch
+        self.executor = executor
+        self.run_inline = run_inline
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+
+        self._pending = []
+        self._timer = None
+
+        self.batches = 0
+        self.inline_batches = 0
+        self.frames = 0
+        self.max_batch_seen = 0
+
+    async def predict_proba(self, model, landmarks):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((model, landmarks, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        pending, self._pending = self._pending, []
+
+        groups = {}
+        for model, landmarks, future in pending:
+            if future.done():
+                continue
+            group = groups.setdefault(id(model), (model, [], []))
+            group[1].append(landmarks)
+            group[2].append(future)
+
+        for model, batch, futures in groups.values():
+            asyncio.ensure_future(self._run(model, batch, futures))
+
+    async def _run(self, model, batch, futures):
+        self.batches += 1
+        self.frames += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+
+        loop = asyncio.get_running_loop()
+        try:
+            if self.run_inline is not None and self.run_inline(model):
+                self.inline_batches += 1
+                probs = self.predict_proba_batch(model, batch)
+            else:
+                probs = await loop.run_in_executor(
+                    self.executor, self.predict_proba_batch, model, batch
+                )
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, row in zip(futures, probs):
+            if not future.done():
+                future.set_result(row)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "inline_batches": self.inline_batches,
+            "frames": self.frames,
+            "avg_batch_size": self.frames / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_seen,
+        }
@@ -1,112 +1,113 @@
-import pyautogui
 import os
-import subprocess
-import webbrowser
+import time
 from datetime import datetime
 
-from PIL import ImageGrab
+from backend.action_backends import get_backend
+from backend.screenshots import writer as screenshot_writer
+
 def volume_up():
-    pyautogui.press("volumeup")
+    get_backend().press("volumeup")
 
 def volume_down():
-    pyautogui.press("volumedown")
+    get_backend().press("volumedown")
 
 def mute():
-    pyautogui.press("volumemute")
+    get_backend().press("volumemute")
 
 def unmute():
-    pyautogui.press("volumemute")
+    get_backend().press("volumemute")
 
 def play_media():
-    pyautogui.press("playpause")
+    get_backend().press("playpause")
 
 def pause_media():
-    pyautogui.press("playpause")
+    get_backend().press("playpause")
 
 def next_track():
-    print(123)
-    pyautogui.press("nexttrack")
+    get_backend().press("nexttrack")
 
 def previous_track():
-    pyautogui.press("prevtrack")
+    get_backend().press("prevtrack")
+
+SCREENSHOT_BURST = int(os.getenv("SCREENSHOT_BURST", "1"))
+SCREENSHOT_BURST_INTERVAL_S = float(os.getenv("SCREENSHOT_BURST_INTERVAL_S", "0.1"))
 
 def screenshot():
     folder = os.path.join(os.path.expanduser("~"), "Pictures", "GestureShots")
-    os.makedirs(folder, exist_ok=True)
+    get_backend().makedirs(folder)
 
-    filename = f"screenshot_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-    path = os.path.join(folder, filename)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
 
-    img = ImageGrab.grab()
+    # Only the grab happens here; encoding and the write run on the writer thread
+    for i in range(SCREENSHOT_BURST):
+        if i:
+            time.sleep(SCREENSHOT_BURST_INTERVAL_S)
 
-    try:
-        img.save(path)
-        print("Saved to:", path)
-        print("Exists?", os.path.exists(path))
-    except Exception as e:
-        print("Error while saving:", e)
+        suffix = f"_{i + 1}" if SCREENSHOT_BURST > 1 else ""
+        img = get_backend().grab_screen()
+        screenshot_writer.submit(img, os.path.join(folder, f"screenshot_{stamp}{suffix}"))
 
 def lock_screen():
-    os.system("rundll32.exe user32.dll,LockWorkStation")
+    get_backend().system("rundll32.exe user32.dll,LockWorkStation")
 
 def minimize_all_windows():
-    pyautogui.hotkey("win", "d")
+    get_backend().hotkey("win", "d")
 
 def maximize_current_window():
-    pyautogui.hotkey("win", "up")
+    get_backend().hotkey("win", "up")
 
 def minimize_current_window():
-    pyautogui.hotkey("win", "down")
+    get_backend().hotkey("win", "down")
     
     
 def new_tab():
-    pyautogui.hotkey("ctrl", "t")
+    get_backend().hotkey("ctrl", "t")
 
 def close_tab():
-    pyautogui.hotkey("ctrl", "w")
+    get_backend().hotkey("ctrl", "w")
 
 def reopen_closed_tab():
-    pyautogui.hotkey("ctrl", "shift", "t")
+    get_backend().hotkey("ctrl", "shift", "t")
 
 def refresh_page():
-    pyautogui.press("f5")
+    get_backend().press("f5")
 
 def scroll_up():
-    pyautogui.scroll(600)
+    get_backend().scroll(600)
 
 def scroll_down():
-    pyautogui.scroll(-600)
+    get_backend().scroll(-600)
 
 def zoom_in():
-    pyautogui.hotkey("ctrl", "+")
+    get_backend().hotkey("ctrl", "+")
 
 def zoom_out():
-    pyautogui.hotkey("ctrl", "-")
+    get_backend().hotkey("ctrl", "-")
 
 def open_youtube():
-    webbrowser.open("https://youtube.com")
+    get_backend().open_url("https://youtube.com")
 
 def open_chatgpt():
-    webbrowser.open("https://chat.openai.com")
+    get_backend().open_url("https://chat.openai.com")
     
 def open_vscode():
-    subprocess.Popen(["code", "."])
+    get_backend().popen(["code", "."])
 
 def open_terminal():
-    subprocess.Popen("start cmd", shell=True)
+    get_backend().popen("start cmd", shell=True)
 
 def run_code():
-    pyautogui.press("f5")
+    get_backend().press("f5")
 
-def git_pull():
-    subprocess.run(["git", "pull"], shell=True)
+def git_pull(timeout=None):
+    get_backend().run(["git", "pull"], shell=True, timeout=timeout)
 
-def git_push():
-    subprocess.run(["git", "push"], shell=True)
+def git_push(timeout=None):
+    get_backend().run(["git", "push"], shell=True, timeout=timeout)
 
 def create_html_template():
     folder = "HTML_Project"
-    os.makedirs(folder, exist_ok=True)
+    get_backend().makedirs(folder)
 
     path = os.path.join(folder, "index.html")
 
@@ -120,8 +121,7 @@ def create_html_template():
 </body>
 </html>"""
 
-    with open(path, "w") as f:
-        f.write(template)
+    get_backend().write_file(path, template)
 
 def create_react_component():
     component_name = "NewComponent"
@@ -140,12 +140,11 @@ const {component_name} = () => {{
 export default {component_name};
 """
 
-    with open(filename, "w") as f:
-        f.write(template)
+    get_backend().write_file(filename, template)
 
 def create_node_api_template():
     folder = "Node_API"
-    os.makedirs(folder, exist_ok=True)
+    get_backend().makedirs(folder)
 
     path = os.path.join(folder, "server.js")
 
@@ -159,44 +158,92 @@ app.get('/', (req, res) => {
 app.listen(3000, () => console.log('Server started'));
 """
 
-    with open(path, "w") as f:
-        f.write(template)
+    get_backend().write_file(path, template)
 
 def create_readme():
     content = "# Project Title\n\n## Description\n\n## Installation\n\n## Usage\n"
-    with open("README.md", "w") as f:
-        f.write(content)
+    get_backend().write_file("README.md", content)
         
 def create_new_folder():
-    os.makedirs("New_Folder", exist_ok=True)
+    get_backend().makedirs("New_Folder")
 
 def rename_selected_file():
-    pyautogui.press("f2")
+    get_backend().press("f2")
 
 def delete_selected_file():
-    pyautogui.press("delete")
+    get_backend().press("delete")
 
 def open_downloads():
-    os.startfile(os.path.join(os.path.expanduser("~"), "Downloads"))
+    get_backend().open_path(os.path.join(os.path.expanduser("~"), "Downloads"))
 
 def open_documents():
-    os.startfile(os.path.join(os.path.expanduser("~"), "Documents"))
+    get_backend().open_path(os.path.join(os.path.expanduser("~"), "Documents"))
 
 def open_desktop():
-    os.startfile(os.path.join(os.path.expanduser("~"), "Desktop"))
+    get_backend().open_path(os.path.join(os.path.expanduser("~"), "Desktop"))
     
 def presentation_mode():
-    pyautogui.press("f5")
+    get_backend().press("f5")
 
 def meeting_mode():
     mute()
     minimize_all_windows()
-    webbrowser.open("https://zoom.us")
+    get_backend().open_url("https://zoom.us")
 
 def study_mode():
-    webbrowser.open("https://leetcode.com")
+    get_backend().open_url("https://leetcode.com")
     open_vscode()
 
 def focus_mode():
-    subprocess.call("taskkill /f /im chrome.exe", shell=True)
-    subprocess.call("taskkill /f /im spotify.exe", shell=True)
\ No newline at end of file
+    get_backend().run("taskkill /f /im chrome.exe", shell=True)
+    get_backend().run("taskkill /f /im spotify.exe", shell=True)
+
+
+ACTION_MAP = {
+    "Volume Up": volume_up,
+    "Volume Down": volume_down,
+    "Mute": mute,
+    "Unmute": unmute,
+    "Play Media": play_media,
+    "Pause Media": pause_media,
+    "Next Track": next_track,
+    "Previous Track": previous_track,
+    "Screenshot": screenshot,
+    "Lock Screen": lock_screen,
+    "Minimize All Windows": minimize_all_windows,
+    "Maximize Current Window": maximize_current_window,
+    "Minimize Current Window": minimize_current_window,
+
+    "New Tab": new_tab,
+    "Close Tab": close_tab,
+    "Reopen Closed Tab": reopen_closed_tab,
+    "Refresh Page": refresh_page,
+    "Scroll Up": scroll_up,
+    "Scroll Down": scroll_down,
+    "Zoom In": zoom_in,
+    "Zoom Out": zoom_out,
+    "Open YouTube": open_youtube,
+    "Open ChatGPT": open_chatgpt,
+
+    "Open VS Code": open_vscode,
+    "Open Terminal": open_terminal,
+    "Run Code": run_code,
+    "Git Pull": git_pull,
+    "Git Push": git_push,
+    "Create HTML Project": create_html_template,
+    "Create React Component": create_react_component,
+    "Create Node API": create_node_api_template,
+    "Create README.md": create_readme,
+
+    "Create New Folder": create_new_folder,
+    "Rename Selected File": rename_selected_file,
+    "Delete Selected File": delete_selected_file,
+    "Open Downloads": open_downloads,
+    "Open Documents": open_documents,
+    "Open Desktop": open_desktop,
+
+    "Presentation Mode": presentation_mode,
+    "Meeting Mode": meeting_mode,
+    "Study Mode": study_mode,
+    "Focus Mode": focus_mode,
+}
@@ -0,0 +1,44 @@
+import cv2
+import numpy as np
+
+
+class FrameChangeDetector:
+    # Lets a session skip hand detection when the camera sees the same scene
+    # as the last frame that was actually processed. Frames are compared as
+    # tiny grayscale thumbnails, so sensor noise averages out and the check
+    # costs far less than MediaPipe.
+    #
+    # The reference thumbnail only moves when detection runs, so slow drift
+    # can't creep past the threshold one small step at a time, and detection
+    # is forced again after max_skip static frames in a row.
+
+    def __init__(self, threshold=2.0, size=(32, 24), max_skip=30):
+        self.threshold = threshold
+        self.size = size
+        self.max_skip = max_skip
+        self.reference = None
+        self.landmarks = None
+        self.skipped = 0
+        self.static = False
+
+    def thumbnail(self, img):
+        small = cv2.resize(img, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+        return small.astype(np.int16)
+
+    def matches(self, thumb):
+        # Mean absolute difference against the reference, in 0-255 gray levels
+        self.static = (
+            self.reference is not None
+            and self.skipped < self.max_skip
+            and float(np.abs(thumb - self.reference).mean()) <= self.threshold
+        )
+        if self.static:
+            self.skipped += 1
+        return self.static
+
+    def remember(self, thumb, landmarks):
+        self.reference = thumb
+        self.landmarks = landmarks
+        self.skipped = 0
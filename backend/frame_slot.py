@@ -0,0 +1,68 @@
+import asyncio
+
+from fastapi import WebSocketDisconnect
+
+
+class LatestFrameSlot:
+    # Single-slot mailbox between the socket reader and the prediction loop.
+    # A new frame replaces any frame that hasn't been picked up yet, so the
+    # loop always works on the newest one and stale frames are just counted.
+
+    def __init__(self):
+        self._frame = None
+        self._event = asyncio.Event()
+        self._closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame):
+        # Returns True when an unprocessed frame was replaced
+        replaced = self._frame is not None
+        if replaced:
+            self.dropped += 1
+        self._frame = frame
+        self.received += 1
+        self._event.set()
+        return replaced
+
+    def close(self):
+        self._closed = True
+        self._event.set()
+
+    async def get(self):
+        while self._frame is None:
+            if self._closed:
+                raise WebSocketDisconnect()
+            self._event.clear()
+            await self._event.wait()
+
+        frame, self._frame = self._frame, None
+        return frame
+
+
+class RateController:
+    # Recommends a client frame interval from an EMA of server-side latency
+
+    def __init__(self, min_interval_ms=50, max_interval_ms=1000, headroom=1.25, alpha=0.2):
+        self.min_interval_ms = min_interval_ms
+        self.max_interval_ms = max_interval_ms
+        self.headroom = headroom
+        self.alpha = alpha
+        self.latency_ms = None
+
+    def observe(self, latency_ms):
+        if self.latency_ms is None:
+            self.latency_ms = latency_ms
+        else:
+            self.latency_ms += self.alpha * (latency_ms - self.latency_ms)
+
+    def backoff(self):
+        # Doubles the latency estimate when the server had to turn a frame away
+        base = self.latency_ms if self.latency_ms is not None else self.min_interval_ms
+        self.latency_ms = min(self.max_interval_ms, base * 2)
+
+    def interval_ms(self):
+        if self.latency_ms is None:
+            return self.min_interval_ms
+        interval = self.latency_ms * self.headroom
+        return int(min(self.max_interval_ms, max(self.min_interval_ms, interval)))
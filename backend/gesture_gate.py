@@ -0,0 +1,76 @@
+import numpy as np
+
+
+class GestureGate:
+    # Decides when a stream of per-frame class probabilities should fire an
+    # action. A gesture fires once it is above `min_confidence` for
+    # `agree_frames` consecutive frames (or, with `ema_alpha`, once the
+    # exponential average of probabilities clears the threshold), is not
+    # the gesture already being held, and is outside its cooldown. A held
+    # gesture is released by a different confirmed gesture or by
+    # `agree_frames` unconfident frames in a row.
+    # State is a few scalars and two preallocated arrays, updated in place.
+
+    def __init__(self, num_classes, min_confidence=0.8, agree_frames=3, cooldown_s=1.0, ema_alpha=None):
+        self.min_confidence = min_confidence
+        self.agree_frames = max(1, agree_frames)
+        self.cooldown_s = cooldown_s
+        self.ema_alpha = ema_alpha
+
+        self.ema = np.zeros(num_classes, dtype=np.float32)
+        self.last_fired = np.full(num_classes, -np.inf)
+
+        self.candidate = -1
+        self.streak = 0
+        self.unsure = 0
+        self.active = -1
+
+    def reset(self):
+        self.ema.fill(0)
+        self.candidate = -1
+        self.streak = 0
+        self.unsure = 0
+        self.active = -1
+
+    def update(self, probs, now):
+        # Returns (class index, confidence, fire)
+        if self.ema_alpha is not None:
+            self.ema *= 1 - self.ema_alpha
+            self.ema += self.ema_alpha * probs
+            scores = self.ema
+        else:
+            scores = probs
+
+        idx = int(scores.argmax())
+        confidence = float(scores[idx])
+
+        if confidence < self.min_confidence:
+            self.candidate = -1
+            self.streak = 0
+            self.unsure += 1
+            if self.unsure >= self.agree_frames:
+                self.active = -1
+            return idx, confidence, False
+
+        self.unsure = 0
+
+        if idx == self.candidate:
+            self.streak += 1
+        else:
+            self.candidate = idx
+            self.streak = 1
+
+        # The EMA already integrates over time, so one confident frame is enough
+        needed = 1 if self.ema_alpha is not None else self.agree_frames
+        if self.streak < needed or idx == self.active:
+            return idx, confidence, False
+
+        if now - self.last_fired[idx] < self.cooldown_s:
+            # A different gesture was confirmed, so the held one was released;
+            # this one stays unheld and fires once its cooldown ends
+            self.active = -1
+            return idx, confidence, False
+
+        self.active = idx
+        self.last_fired[idx] = now
+        return idx, confidence, True
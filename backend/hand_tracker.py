@@ -0,0 +1,52 @@
+import numpy as np
+
+
+class HandTracker:
+    # Remembers where the hand was in the previous frame so the next
+    # detection can run on a padded crop around it. The box is kept in
+    # normalized [0, 1] image coordinates so it survives resolution changes.
+
+    def __init__(self, pad=0.35, min_size=0.15):
+        self.pad = pad
+        self.min_size = min_size
+        self.box = None
+
+    def reset(self):
+        self.box = None
+
+    def update(self, points):
+        # points: (21, 3) landmarks normalized to the full frame
+        x0, y0 = points[:, 0].min(), points[:, 1].min()
+        x1, y1 = points[:, 0].max(), points[:, 1].max()
+
+        # Square-ish box padded on every side, never smaller than min_size
+        # and never larger than the frame
+        size = min(1.0, max(x1 - x0, y1 - y0, self.min_size) * (1 + 2 * self.pad))
+
+        # Centre clamped so the box lies inside the frame, even when the
+        # landmarks themselves fall partly outside it
+        cx = min(max((x0 + x1) / 2, size / 2), 1 - size / 2)
+        cy = min(max((y0 + y1) / 2, size / 2), 1 - size / 2)
+
+        self.box = (cx - size / 2, cy - size / 2, cx + size / 2, cy + size / 2)
+
+    def pixel_box(self, width, height):
+        # At least one pixel wide and tall, and inside the image
+        x0, y0, x1, y1 = self.box
+        left = min(max(int(x0 * width), 0), width - 1)
+        top = min(max(int(y0 * height), 0), height - 1)
+        right = min(max(int(np.ceil(x1 * width)), left + 1), width)
+        bottom = min(max(int(np.ceil(y1 * height)), top + 1), height)
+        return left, top, right, bottom
+
+
+def roi_to_frame(points, box, width, height):
+    # Maps landmarks detected on a crop back to full-frame normalized
+    # coordinates; z is on the same scale as x, so it follows the width ratio
+    x0, y0, x1, y1 = box
+    roi_w, roi_h = x1 - x0, y1 - y0
+
+    points[:, 0] = (points[:, 0] * roi_w + x0) / width
+    points[:, 1] = (points[:, 1] * roi_h + y0) / height
+    points[:, 2] *= roi_w / width
+    return points
@@ -0,0 +1,108 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import mediapipe as mp
+
+
+class PoolBusy(Exception):
+    pass
+
+
+class HandsPool:
+    # Fixed-size pool of MediaPipe Hands detectors. Detectors are created
+    # lazily up to `size`; callers beyond `max_waiting` are rejected right
+    # away instead of queueing without bound.
+
+    def __init__(self, size, max_waiting=None, timeout=1.0, **hands_kwargs):
+        self.size = max(1, size)
+        self.max_waiting = self.size * 4 if max_waiting is None else max_waiting
+        self.timeout = timeout
+        self.hands_kwargs = hands_kwargs
+
+        self._idle = []
+        self._created = 0
+        self._cond = threading.Condition()
+
+        self.waiting = 0
+        self.acquired = 0
+        self.rejected = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def _create(self):
+        return mp.solutions.hands.Hands(**self.hands_kwargs)
+
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        start = time.perf_counter()
+
+        with self._cond:
+            if not self._idle and self._created >= self.size:
+                if self.waiting >= self.max_waiting:
+                    self.rejected += 1
+                    raise PoolBusy("hand detector pool is saturated")
+
+                self.waiting += 1
+                try:
+                    ready = self._cond.wait_for(
+                        lambda: self._idle or self._created < self.size,
+                        timeout
+                    )
+                finally:
+                    self.waiting -= 1
+
+                if not ready:
+                    self.rejected += 1
+                    raise PoolBusy("timed out waiting for a hand detector")
+
+            if self._idle:
+                hands = self._idle.pop()
+            else:
+                self._created += 1
+                hands = None
+
+            waited = time.perf_counter() - start
+            self.acquired += 1
+            self.wait_time_total += waited
+            self.wait_time_max = max(self.wait_time_max, waited)
+
+        if hands is None:
+            try:
+                hands = self._create()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+
+        return hands
+
+    def release(self, hands):
+        with self._cond:
+            self._idle.append(hands)
+            self._cond.notify()
+
+    @contextmanager
+    def lease(self, timeout=None):
+        hands = self.acquire(timeout)
+        try:
+            yield hands
+        finally:
+            self.release(hands)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "in_use": self._created - len(self._idle),
+                "waiting": self.waiting,
+                "acquired": self.acquired,
+                "rejected": self.rejected,
+                "wait_time_avg_ms": (
+                    self.wait_time_total / self.acquired * 1000
+                    if self.acquired else 0.0
+                ),
+                "wait_time_max_ms": self.wait_time_max * 1000,
+            }
@@ -0,0 +1,214 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Minimal Prometheus-style metrics. An observation is a bisect and a few
+# integer adds under a lock, cheap enough to leave on for every frame.
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+
+# Set inside muted(): observations are dropped, e.g. for training captures
+# that share helpers with the prediction pipeline
+_muted = contextvars.ContextVar("metrics_muted", default=False)
+
+
+@contextmanager
+def muted():
+    token = _muted.set(True)
+    try:
+        yield
+    finally:
+        _muted.reset(token)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets, labels=()):
+        self.buckets = buckets
+        self.labels = labels
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        if _muted.get():
+            return
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self):
+        # (per-bucket counts including +Inf, sum, count), read consistently
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def render(self, name):
+        counts, total, count = self.snapshot()
+
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            labels = format_labels(self.labels + (("le", repr(bound)),))
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = format_labels(self.labels + (("le", "+Inf"),))
+        lines.append(f"{name}_bucket{labels} {count}")
+        lines.append(f"{name}_sum{format_labels(self.labels)} {total}")
+        lines.append(f"{name}_count{format_labels(self.labels)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, labels=()):
+        self.labels = labels
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        if _muted.get():
+            return
+        with self._lock:
+            self.value += amount
+
+    def render(self, name):
+        return [f"{name}{format_labels(self.labels)} {self.value}"]
+
+
+class Family:
+    # A metric name with one child per label value, e.g. stage="decode"
+
+    def __init__(self, name, help_text, kind, label_name=None, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.label_name = label_name
+        self.buckets = buckets
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def _make(self, labels):
+        if self.kind == "histogram":
+            return Histogram(self.buckets, labels)
+        return Counter(labels)
+
+    def labels(self, value=None):
+        child = self._children.get(value)
+        if child is None:
+            with self._lock:
+                child = self._children.get(value)
+                if child is None:
+                    labels = ((self.label_name, value),) if self.label_name else ()
+                    child = self._make(labels)
+                    self._children[value] = child
+        return child
+
+    def children(self):
+        # Label value -> child metric
+        return dict(self._children)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for child in list(self._children.values()):
+            lines.extend(child.render(self.name))
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._families = []
+        self._collectors = []
+
+    def histogram(self, name, help_text, label_name=None, buckets=DEFAULT_BUCKETS):
+        family = Family(name, help_text, "histogram", label_name, buckets)
+        self._families.append(family)
+        return family
+
+    def counter(self, name, help_text, label_name=None):
+        family = Family(name, help_text, "counter", label_name)
+        self._families.append(family)
+        return family
+
+    def collect_stats(self, prefix, stats_fn):
+        # Exposes every numeric value of a stats() dict as a gauge
+        self._collectors.append((prefix, stats_fn))
+
+    def render(self):
+        lines = []
+        for family in self._families:
+            lines.extend(family.render())
+
+        for prefix, stats_fn in self._collectors:
+            for key, value in stats_fn().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram(
+    "gesture_stage_seconds",
+    "Time spent in each stage of the prediction pipeline",
+    label_name="stage"
+)
+frames_total = registry.counter(
+    "gesture_frames_total",
+    "Prediction frames by outcome",
+    label_name="outcome"
+)
+retrain_seconds = registry.histogram(
+    "gesture_retrain_seconds",
+    "Wall time of model retrains",
+    label_name="mode"
+)
+retrain_val_accuracy = registry.histogram(
+    "gesture_retrain_val_accuracy",
+    "Validation accuracy of retrained models, on held-out captures",
+    label_name="mode",
+    buckets=(0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.98, 0.99, 1.0)
+)
+retrain_low_accuracy_total = registry.counter(
+    "gesture_retrain_low_accuracy_total",
+    "Retrains whose validation accuracy fell below RETRAIN_MIN_VAL_ACCURACY",
+    label_name="mode"
+)
+actions_total = registry.counter(
+    "gesture_actions_total",
+    "Dispatched actions by result",
+    label_name="status"
+)
+detections_total = registry.counter(
+    "gesture_detections_total",
+    "Hand detection attempts by search area",
+    label_name="mode"
+)
+static_frames_total = registry.counter(
+    "gesture_static_frames_total",
+    "Frames that matched the last processed frame and skipped detection"
+)
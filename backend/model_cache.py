@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+def model_nbytes(model):
+    if hasattr(model, "nbytes"):
+        return model.nbytes
+
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class ModelCache:
+    # LRU cache of loaded user models, bounded by entry count and bytes.
+    # Entries are keyed by user and model version (the user_models
+    # `updated_at`), so a retrain on any worker makes the old entry miss.
+
+    def __init__(self, max_entries=256, max_bytes=256 * 1024 * 1024, ttl=3600.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id, version):
+        with self._lock:
+            entry = self._entries.get(user_id)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            entry_version, loaded_at, nbytes, value = entry
+            if entry_version != version or time.monotonic() - loaded_at > self.ttl:
+                self._remove(user_id)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return value
+
+    def put(self, user_id, version, value, nbytes=0):
+        with self._lock:
+            if user_id in self._entries:
+                self._remove(user_id)
+
+            self._entries[user_id] = (version, time.monotonic(), nbytes, value)
+            self.nbytes += nbytes
+
+            while self._entries and (
+                len(self._entries) > self.max_entries or self.nbytes > self.max_bytes
+            ):
+                oldest = next(iter(self._entries))
+                if oldest == user_id and len(self._entries) == 1:
+                    break
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if user_id in self._entries:
+                self._remove(user_id)
+
+    def _remove(self, user_id):
+        entry = self._entries.pop(user_id)
+        self.nbytes -= entry[2]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,96 @@
+import json
+import os
+import queue
+import struct
+import threading
+import time
+
+
+# Session recordings for benchmarking. A file is one JSON header line
+# followed by length-prefixed records:
+#   <timestamp: f64> <kind: u8> <length: u32> <payload>
+# kind 0 is a binary websocket message, kind 1 a JSON text message.
+
+RECORD = struct.Struct("<dBI")
+KIND_BYTES = 0
+KIND_JSON = 1
+
+
+class SessionRecorder:
+    # Writes happen on a background thread so recording never blocks the
+    # socket; if the writer falls behind, frames are dropped from the file.
+
+    def __init__(self, path, frame_format, max_pending=256):
+        self.path = path
+        self.started = time.perf_counter()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "wb")
+        self._file.write((json.dumps({
+            "version": 1,
+            "frame_format": frame_format,
+            "created_at": time.time()
+        }) + "\n").encode())
+
+        self._queue = queue.Queue(max_pending)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._work, name="session-recorder", daemon=True)
+        self._thread.start()
+        self.dropped = 0
+
+    def record(self, frame_bytes, data):
+        t = time.perf_counter() - self.started
+        if frame_bytes is not None:
+            record = (t, KIND_BYTES, bytes(frame_bytes))
+        else:
+            record = (t, KIND_JSON, json.dumps(data).encode())
+
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _work(self):
+        while True:
+            try:
+                record = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._stop.is_set():
+                    break
+                continue
+            if record is None:
+                break
+            t, kind, payload = record
+            self._file.write(RECORD.pack(t, kind, len(payload)))
+            self._file.write(payload)
+        self._file.close()
+
+    def close(self):
+        # Called from the event loop, so never blocks: if the queue is full
+        # the writer drains it and then notices the stop flag
+        self._stop.set()
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+
+def read_recording(path):
+    # Returns the header and a list of (timestamp, frame_bytes, data)
+    frames = []
+    with open(path, "rb") as f:
+        header = json.loads(f.readline())
+
+        while True:
+            head = f.read(RECORD.size)
+            if len(head) < RECORD.size:
+                break
+
+            t, kind, length = RECORD.unpack(head)
+            payload = f.read(length)
+
+            if kind == KIND_BYTES:
+                frames.append((t, payload, None))
+            else:
+                frames.append((t, None, json.loads(payload)))
+
+    return header, frames
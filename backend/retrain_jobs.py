@@ -0,0 +1,192 @@
+import importlib
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class QueueFull(Exception):
+    pass
+
+
+def call_by_name(target, *args, **kwargs):
+    # Calls "module:function", importing the module in whichever process runs it
+    module_name, name = target.split(":")
+    return getattr(importlib.import_module(module_name), name)(*args, **kwargs)
+
+
+# Set in each worker process by _init_worker
+_progress_queue = None
+
+
+def _init_worker(progress_queue, initializer, initargs):
+    global _progress_queue
+    _progress_queue = progress_queue
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _run_job(train_fn, job_id, user_id, options):
+    # Runs in a worker process; state changes go back over the progress queue
+    _progress_queue.put((job_id, "started", time.time()))
+
+    def progress(epoch, epochs, loss):
+        _progress_queue.put((job_id, "progress", (epoch, epochs, loss)))
+
+    return train_fn(user_id, progress, **options)
+
+
+class RetrainJob:
+    def __init__(self, user_id):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.status = "queued"
+        self.epoch = 0
+        self.epochs = None
+        self.loss = None
+        self.classes = None
+        self.metrics = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "epoch": self.epoch,
+            "epochs": self.epochs,
+            "loss": self.loss,
+            "classes": self.classes,
+            "metrics": self.metrics,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class RetrainQueue:
+    # Runs retrains in separate worker processes so training never holds
+    # the serving process's GIL or cores. A user has at most one
+    # queued/running job; resubmitting returns that job instead of training
+    # twice. train_fn must be a picklable top-level function; it runs in the
+    # worker, while on_finished(job) runs back in this process.
+
+    def __init__(
+        self, train_fn, max_workers=1, max_pending=32, keep_finished=3600.0,
+        on_finished=None, initializer=None, initargs=()
+    ):
+        self.train_fn = train_fn
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+        self.on_finished = on_finished
+        self.initializer = initializer
+        self.initargs = initargs
+
+        # spawn, not fork: the serving process has threads and native libraries
+        self._context = multiprocessing.get_context("spawn")
+        self._progress = self._context.Queue()
+        self._executor = self._make_executor()
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._active_by_user = {}
+
+        threading.Thread(target=self._listen, name="retrain-progress", daemon=True).start()
+
+    def _make_executor(self):
+        return ProcessPoolExecutor(
+            self.max_workers,
+            mp_context=self._context,
+            initializer=_init_worker,
+            initargs=(self._progress, self.initializer, self.initargs)
+        )
+
+    def submit(self, user_id, **options):
+        with self._lock:
+            self._prune()
+
+            job_id = self._active_by_user.get(user_id)
+            if job_id is not None:
+                return self._jobs[job_id]
+
+            pending = sum(1 for job in self._jobs.values() if job.active)
+            if pending >= self.max_pending:
+                raise QueueFull("too many retrain jobs queued")
+
+            job = RetrainJob(user_id)
+            self._jobs[job.id] = job
+            self._active_by_user[user_id] = job.id
+
+            try:
+                executor = self._executor
+                future = executor.submit(_run_job, self.train_fn, job.id, user_id, options)
+            except BrokenProcessPool:
+                # A worker died earlier; start a fresh pool and try once more
+                executor = self._executor = self._make_executor()
+                future = executor.submit(_run_job, self.train_fn, job.id, user_id, options)
+
+        future.add_done_callback(lambda f: self._finish(job, executor, f))
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _listen(self):
+        while True:
+            job_id, kind, value = self._progress.get()
+
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+
+                if kind == "started":
+                    job.started_at = value
+                    if job.status == "queued":
+                        job.status = "running"
+                elif job.active:
+                    job.epoch, job.epochs, job.loss = value
+
+    def _finish(self, job, executor, future):
+        try:
+            job.classes, job.metrics = future.result()
+            status = "done"
+        except BrokenProcessPool:
+            job.error = "retrain worker process exited unexpectedly"
+            status = "failed"
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = self._make_executor()
+        except Exception as e:
+            job.error = str(e)
+            status = "failed"
+
+        # finished_at first, so _prune never sees a finished job without it
+        job.finished_at = time.time()
+        with self._lock:
+            job.status = status
+            self._active_by_user.pop(job.user_id, None)
+
+        if self.on_finished is not None:
+            try:
+                self.on_finished(job)
+            except Exception as e:
+                print("Retrain callback error:", e)
+
+    def _prune(self):
+        cutoff = time.time() - self.keep_finished
+        for job_id in [
+            job_id for job_id, job in self._jobs.items()
+            if not job.active and job.finished_at < cutoff
+        ]:
+            del self._jobs[job_id]
@@ -0,0 +1,78 @@
+import os
+import queue
+import threading
+
+
+# Screen captures are taken on the calling thread and handed to a background
+# writer for encoding and disk I/O. At most `max_in_flight` captures wait
+# to be written; beyond that new captures are dropped rather than queued.
+
+SAVE_OPTIONS = {
+    "png": lambda level, quality: {"format": "PNG", "compress_level": level},
+    "jpeg": lambda level, quality: {"format": "JPEG", "quality": quality},
+    "webp": lambda level, quality: {"format": "WEBP", "quality": quality, "method": 4},
+}
+
+EXTENSIONS = {"png": "png", "jpeg": "jpg", "webp": "webp"}
+
+
+class ScreenshotWriter:
+    def __init__(self, image_format="png", png_level=1, quality=85, max_in_flight=4):
+        self.image_format = image_format
+        self.extension = EXTENSIONS[image_format]
+        self.save_options = SAVE_OPTIONS[image_format](png_level, quality)
+
+        self._queue = queue.Queue(max_in_flight)
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._work, name="screenshot-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _work(self):
+        while True:
+            img, path = self._queue.get()
+            try:
+                # JPEG has no alpha channel
+                if self.image_format == "jpeg" and getattr(img, "mode", "RGB") != "RGB":
+                    img = img.convert("RGB")
+                img.save(path, **self.save_options)
+                self.written += 1
+            except Exception as e:
+                self.failed += 1
+                print("Screenshot save error:", e)
+
+    def submit(self, img, path_stem):
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((img, f"{path_stem}.{self.extension}"))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def stats(self):
+        return {
+            "format": self.image_format,
+            "in_flight": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+writer = ScreenshotWriter(
+    image_format=os.getenv("SCREENSHOT_FORMAT", "png").lower(),
+    png_level=int(os.getenv("SCREENSHOT_PNG_LEVEL", "1")),
+    quality=int(os.getenv("SCREENSHOT_QUALITY", "85")),
+    max_in_flight=int(os.getenv("SCREENSHOT_MAX_IN_FLIGHT", "4"))
+)
@@ -0,0 +1,47 @@
+import argparse
+import asyncio
+import statistics
+import time
+
+from backend.action_backends import RecordingBackend, set_backend
+from backend.action_dispatcher import ActionDispatcher
+from backend.commands import ACTION_MAP
+
+
+# Runs every ACTION_MAP entry through the ActionDispatcher against the
+# in-process RecordingBackend, so it needs no display.
+#   python -m benchmarks.bench_actions --runs 200
+
+async def bench(dispatcher, backend, name, runs):
+    timings = []
+    for _ in range(runs):
+        backend.clear()
+        start = time.perf_counter()
+        report = await dispatcher.dispatch(name)
+        if report["status"] != "ok":
+            raise SystemExit(f"{name}: {report}")
+        # Latency to the first side effect the action produced
+        first_call = backend.calls[0][0] if backend.calls else time.perf_counter()
+        timings.append(((first_call - start) * 1e6, (time.perf_counter() - start) * 1e6))
+    return timings
+
+
+async def main(runs):
+    backend = RecordingBackend()
+    set_backend(backend)
+    dispatcher = ActionDispatcher(ACTION_MAP, default_timeout=5.0)
+
+    print(f"{'action':<26} {'first effect p50':>16} {'done p50':>10} {'done p99':>10}  (us)")
+    for name in ACTION_MAP:
+        timings = await bench(dispatcher, backend, name, runs)
+        first = statistics.median(t[0] for t in timings)
+        done = sorted(t[1] for t in timings)
+        p99 = done[min(len(done) - 1, int(len(done) * 0.99))]
+        print(f"{name:<26} {first:16.1f} {statistics.median(done):10.1f} {p99:10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.runs))
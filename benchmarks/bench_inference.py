@@ -0,0 +1,52 @@
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from models.model_train import LandmarkMLP, export_numpy_model, predict
+from models.inference import load_numpy_model
+
+
+# Per-frame predict latency: eager torch LandmarkMLP versus the exported
+# BatchNorm-folded NumPy model.
+#   python -m benchmarks.bench_inference --classes 8 --runs 20000
+
+def time_predict(model, classes, frames):
+    start = time.perf_counter()
+    for x in frames:
+        predict(model, classes, x)
+    return (time.perf_counter() - start) / len(frames) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--classes", type=int, default=8)
+    parser.add_argument("--runs", type=int, default=20000)
+    args = parser.parse_args()
+
+    classes = [f"g{i}" for i in range(args.classes)]
+    model = LandmarkMLP(len(classes))
+
+    # Give BatchNorm non-trivial running stats before exporting
+    model.train()
+    with torch.no_grad():
+        for _ in range(10):
+            model(torch.randn(256, 63))
+    model.eval()
+
+    numpy_model = load_numpy_model(export_numpy_model(model, classes))
+
+    frames = np.random.randn(args.runs, 21, 3).astype(np.float32).tolist()
+
+    with torch.no_grad():
+        expected = model(torch.tensor(frames[:256]).view(-1, 63)).argmax(1).numpy()
+    got = numpy_model.predict_proba(frames[:256]).argmax(1)
+    print(f"argmax agreement: {(expected == got).mean():.4f}")
+
+    print(f"torch eager  {time_predict(model, classes, frames):8.1f} us/frame")
+    print(f"numpy folded {time_predict(numpy_model, classes, frames):8.1f} us/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import argparse
+import os
+import statistics
+import time
+
+from pymongo import MongoClient
+
+from models.model_train import load_user_model
+from models.storage import get_mongo_client
+
+
+# Cold model load: a fresh MongoClient per call (the old behaviour) versus the
+# shared pooled client. Run from the repo root:
+#   python -m benchmarks.bench_model_load --user-id <id>
+
+def time_loads(user_id, mongo_uri, db_name, runs, make_client):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        model, classes = load_user_model(
+            mongo_uri=mongo_uri,
+            db_name=db_name,
+            model_collection_name="user_models",
+            user_id=user_id,
+            client=make_client()
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+
+        if model is None:
+            raise SystemExit(f"No model stored for user {user_id}")
+
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{name:<16} mean {statistics.mean(timings):8.2f} ms   "
+          f"p50 {statistics.median(timings):8.2f} ms   p95 {p95:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--user-id", required=True)
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default="gesture_app")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    report("new client", time_loads(
+        args.user_id, args.mongo_uri, args.db, args.runs,
+        lambda: MongoClient(args.mongo_uri)
+    ))
+    report("shared client", time_loads(
+        args.user_id, args.mongo_uri, args.db, args.runs,
+        lambda: get_mongo_client(args.mongo_uri)
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Replays use an in-memory Mongo and a desktop backend that does nothing
+os.environ.setdefault("MONGO_URI", "mongomock://")
+os.environ.setdefault("ACTION_BACKEND", "noop")
+
+from backend import app as server
+from backend.commands import ACTION_MAP
+from backend.metrics import stage_seconds, frames_total, static_frames_total
+from backend.recording import read_recording
+from models.inference import dump_numpy_model, load_numpy_model
+
+
+# Pushes a session recorded with RECORD_DIR through the real /ws/predict
+# handler, with a stand-in WebSocket feeding the recorded frames, and prints
+# a JSON report that can be diffed between commits. Stage timings are read
+# from the server's own stage histograms, so every stage the handler
+# instruments (queueing, decode, detection, batching, actions) is covered.
+#
+#   python -m benchmarks.replay session.grec --output before.json
+#   python -m benchmarks.replay session.grec --compare before.json
+#
+# --model takes an exported model (the inference_binary field of a
+# user_models document); without it a fixed-seed random model is used.
+# Frames are sent one at a time as responses arrive, like the dashboard;
+# --realtime instead keeps the recorded timing, so frames can be dropped.
+
+REPLAY_USER = "replay"
+
+
+def random_model(num_classes, seed=0):
+    rng = np.random.default_rng(seed)
+    sizes = (63, 128, 64, num_classes)
+    weights = [rng.normal(0, 0.1, (a, b)) for a, b in zip(sizes, sizes[1:])]
+    biases = [np.zeros(b) for b in sizes[1:]]
+    return dump_numpy_model(weights, biases, [f"gesture_{i}" for i in range(num_classes)])
+
+
+def install_model(blob):
+    # Stores the model and a gesture->action map the handler will load
+    classes = load_numpy_model(blob).classes
+
+    server.models.update_one(
+        {"user_id": REPLAY_USER},
+        {"$set": {"inference_binary": blob, "updated_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+
+    action_names = sorted(ACTION_MAP)
+    server.gesture_action.delete_many({"user_id": REPLAY_USER})
+    server.gesture_action.insert_many([
+        {"user_id": REPLAY_USER, "gesture": c, "action": action_names[i % len(action_names)]}
+        for i, c in enumerate(classes)
+    ])
+    server.invalidate_action_map(REPLAY_USER)
+
+
+class ReplaySocket:
+    # Just enough of starlette's WebSocket for websocket_predict
+
+    def __init__(self, frames, frame_format, realtime):
+        self.frames = frames
+        self.frame_format = frame_format
+        self.realtime = realtime
+        self.messages = []
+        self.closed = False
+        self._next = 0
+        self._started = None
+        self._ready = asyncio.Event()
+        # Closed loop: the next frame goes out once the last one was answered
+        self._credit = asyncio.Event()
+
+    async def accept(self):
+        pass
+
+    async def close(self, code=1000):
+        self.closed = True
+        self._ready.set()
+        self._credit.set()
+
+    async def receive_json(self):
+        return {"token": server.create_token(REPLAY_USER), "frame_format": self.frame_format}
+
+    async def send_json(self, message):
+        self.messages.append(message)
+        if message.get("status") == "ready":
+            self._started = time.perf_counter()
+            self._ready.set()
+            self._credit.set()
+        elif "prediction" in message or message.get("status") == "busy":
+            self._credit.set()
+
+    async def receive(self):
+        if self.realtime:
+            await self._ready.wait()
+            if not self.closed and self._next < len(self.frames):
+                delay = self.frames[self._next][0] - (time.perf_counter() - self._started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        else:
+            await self._credit.wait()
+            self._credit.clear()
+
+        if self.closed or self._next >= len(self.frames):
+            if self.realtime and not self.closed:
+                # Give the handler time to answer the last frame
+                await asyncio.sleep(0.5)
+            return {"type": "websocket.disconnect", "code": 1000}
+
+        _, frame_bytes, data = self.frames[self._next]
+        self._next += 1
+        if frame_bytes is not None:
+            return {"type": "websocket.receive", "bytes": frame_bytes}
+        return {"type": "websocket.receive", "text": json.dumps(data)}
+
+
+def snapshot():
+    stages = {stage: child.snapshot() for stage, child in stage_seconds.children().items()}
+    outcomes = {outcome: child.value for outcome, child in frames_total.children().items()}
+    return stages, outcomes, static_frames_total.labels().value
+
+
+def quantile(q, counts, bounds):
+    # Linear interpolation inside the bucket, as Prometheus' histogram_quantile
+    total = sum(counts)
+    rank = q * total
+    cumulative = 0
+    for i, n in enumerate(counts):
+        if cumulative + n >= rank and n:
+            if i >= len(bounds):
+                return bounds[-1]
+            lower = bounds[i - 1] if i else 0.0
+            return lower + (bounds[i] - lower) * (rank - cumulative) / n
+        cumulative += n
+    return bounds[-1]
+
+
+def stage_report(before, after):
+    report = {}
+    for stage, (counts, total, count) in after.items():
+        old_counts, old_total, old_count = before.get(stage, ([0] * len(counts), 0.0, 0))
+        n = count - old_count
+        if n == 0:
+            continue
+        diff = [a - b for a, b in zip(counts, old_counts)]
+        bounds = stage_seconds.buckets
+        report[stage] = {
+            "count": n,
+            "mean": round((total - old_total) / n * 1000, 3),
+            "p50": round(quantile(0.50, diff, bounds) * 1000, 3),
+            "p95": round(quantile(0.95, diff, bounds) * 1000, 3),
+            "p99": round(quantile(0.99, diff, bounds) * 1000, 3),
+        }
+    return report
+
+
+async def replay(frames, frame_format, model_blob, realtime):
+    install_model(model_blob)
+    socket = ReplaySocket(frames, frame_format, realtime)
+
+    before_stages, before_outcomes, before_static = snapshot()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    await server.websocket_predict(socket)
+    # Let action reports still in flight land
+    await asyncio.sleep(0.1)
+
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    after_stages, after_outcomes, after_static = snapshot()
+
+    errors = [m["error"] for m in socket.messages if "error" in m]
+    if errors:
+        raise SystemExit(f"replay failed: {errors[0]}")
+
+    outcomes = {
+        outcome: value - before_outcomes.get(outcome, 0)
+        for outcome, value in after_outcomes.items()
+    }
+    responses = sum(1 for m in socket.messages if "prediction" in m)
+
+    return {
+        "frames": len(frames),
+        "responses": responses,
+        "frames_with_hand": outcomes.get("hand", 0),
+        "frames_no_hand": outcomes.get("no_hand", 0),
+        "frames_busy": outcomes.get("busy", 0),
+        "frames_dropped": outcomes.get("dropped", 0),
+        "frames_static": after_static - before_static,
+        "actions_fired": sum(1 for m in socket.messages if "action" in m),
+        "fps": round(responses / wall, 2) if wall else 0.0,
+        "cpu_ms_per_frame": round(cpu / max(responses, 1) * 1000, 3),
+        "stages_ms": stage_report(before_stages, after_stages),
+    }
+
+
+def repeat_frames(frames, repeat):
+    # Later passes are shifted in time so --realtime pacing carries on
+    if not frames:
+        return frames
+    gap = (frames[-1][0] - frames[0][0]) / max(len(frames) - 1, 1)
+    span = frames[-1][0] + gap
+    return [
+        (t + i * span, frame_bytes, data)
+        for i in range(repeat)
+        for t, frame_bytes, data in frames
+    ]
+
+
+def compare(report, baseline, threshold):
+    # Prints relative change per stage percentile; True if anything regressed
+    regressed = False
+
+    def line(name, old, new, higher_is_better=False):
+        nonlocal regressed
+        if not old:
+            return
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = "  REGRESSION" if worse > threshold else ""
+        regressed |= bool(flag)
+        print(f"{name:<28} {old:10.3f} -> {new:10.3f}  {change:+7.1%}{flag}")
+
+    line("fps", baseline["fps"], report["fps"], higher_is_better=True)
+    line("cpu_ms_per_frame", baseline["cpu_ms_per_frame"], report["cpu_ms_per_frame"])
+    for stage in sorted(baseline["stages_ms"]):
+        old, new = baseline["stages_ms"][stage], report["stages_ms"].get(stage, {})
+        for key in ("mean", "p50", "p95", "p99"):
+            if key in old and key in new:
+                line(f"{stage}.{key}", old[key], new[key])
+
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("recording")
+    parser.add_argument("--model", help="exported NumPy model file")
+    parser.add_argument("--classes", type=int, default=8)
+    parser.add_argument("--realtime", action="store_true", help="keep the recorded frame timing")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output")
+    parser.add_argument("--compare", help="baseline report to diff against")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    header, frames = read_recording(args.recording)
+    frames = repeat_frames(frames, args.repeat)
+
+    if args.model:
+        with open(args.model, "rb") as f:
+            model_blob = f.read()
+    else:
+        model_blob = random_model(args.classes)
+
+    report = asyncio.run(replay(frames, header["frame_format"], model_blob, args.realtime))
+    text = json.dumps(report, indent=2, sort_keys=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
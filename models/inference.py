@@ -0,0 +1,86 @@
+import io
+
+import numpy as np
+
+
+# Torch-free serving for LandmarkMLP. Training exports the network with
+# BatchNorm folded into the preceding Linear layer and Dropout removed, so
+# inference is just alternating matmul and ReLU over float32 matrices.
+
+class NumpyMLP:
+    def __init__(self, weights, biases, classes):
+        self.weights = [np.ascontiguousarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.ascontiguousarray(b, dtype=np.float32) for b in biases]
+        self.classes = list(classes)
+        self.nbytes = sum(w.nbytes + b.nbytes for w, b in zip(self.weights, self.biases))
+
+    def logits(self, x):
+        last = len(self.weights) - 1
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            x = x @ w
+            x += b
+            if i != last:
+                np.maximum(x, 0, out=x)
+        return x
+
+    def predict_proba(self, x):
+        x = np.asarray(x, dtype=np.float32).reshape(-1, self.weights[0].shape[0])
+        z = self.logits(x)
+        z -= z.max(axis=1, keepdims=True)
+        np.exp(z, out=z)
+        z /= z.sum(axis=1, keepdims=True)
+        return z
+
+
+def fold_batchnorm(weight, bias, gamma, beta, mean, var, eps):
+    scale = gamma / np.sqrt(var + eps)
+    return weight * scale[:, None], (bias - mean) * scale + beta
+
+
+def dump_numpy_model(weights, biases, classes):
+    # weights are stored (in, out) so inputs multiply on the left
+    arrays = {"classes": np.array(classes, dtype=np.str_)}
+    for i, (w, b) in enumerate(zip(weights, biases)):
+        arrays[f"w{i}"] = np.asarray(w, dtype=np.float32)
+        arrays[f"b{i}"] = np.asarray(b, dtype=np.float32)
+
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def load_numpy_model(blob):
+    data = np.load(io.BytesIO(blob), allow_pickle=False)
+
+    weights = []
+    biases = []
+    while f"w{len(weights)}" in data:
+        weights.append(data[f"w{len(weights)}"])
+        biases.append(data[f"b{len(biases)}"])
+
+    return NumpyMLP(weights, biases, data["classes"].tolist())
+
+
+def predict_proba_batch(model, feature_arrays):
+    X = np.asarray(feature_arrays, dtype=np.float32).reshape(len(feature_arrays), -1)
+
+    if isinstance(model, NumpyMLP):
+        return model.predict_proba(X)
+
+    # Legacy torch checkpoints; torch is only imported when one is served
+    import torch
+
+    device = next(model.parameters()).device
+
+    with torch.inference_mode():
+        outputs = model(torch.from_numpy(X).to(device))
+        return torch.softmax(outputs, dim=1).cpu().numpy()
+
+
+def load_inference_model(model_collection, user_id):
+    doc = model_collection.find_one({"user_id": user_id}, {"inference_binary": 1})
+    if not doc or "inference_binary" not in doc:
+        return None, None
+
+    model = load_numpy_model(doc["inference_binary"])
+    return model, model.classes
@@ -0,0 +1,87 @@
+import argparse
+import os
+
+import numpy as np
+
+from models.storage import get_mongo_client, pack_samples, FEATURE_SIZE, PACKED_DTYPES
+
+
+# Converts one-sample-per-document gesture_data into packed documents.
+#   python -m models.migrate_gesture_data --dtype float16 [--user-id <id>] [--dry-run]
+
+def migrate_gesture(collection, user_id, gesture, dtype, chunk_size, dry_run):
+    query = {"user_id": user_id, "gesture": gesture, "features": {"$exists": True}}
+
+    # One packed document per capture and retrain batch, so validation
+    # grouping and incremental retrains see the same data as before
+    ids = []
+    groups = {}
+    for doc in collection.find(query, {"features": 1, "capture_id": 1, "batch": 1}):
+        ids.append(doc["_id"])
+        key = (doc.get("capture_id"), doc.get("batch"))
+        groups.setdefault(key, []).append(
+            np.asarray(doc["features"], dtype=np.float32).reshape(FEATURE_SIZE)
+        )
+
+    if not ids or dry_run:
+        return len(ids)
+
+    docs = []
+    for (capture_id, batch), samples in groups.items():
+        samples = np.stack(samples)
+        extra = {}
+        if capture_id is not None:
+            extra["capture_id"] = capture_id
+        if batch is not None:
+            extra["batch"] = batch
+
+        docs.extend(
+            {
+                "user_id": user_id,
+                "gesture": gesture,
+                **extra,
+                **pack_samples(samples[i:i + chunk_size], dtype)
+            }
+            for i in range(0, len(samples), chunk_size)
+        )
+
+    collection.insert_many(docs)
+    collection.delete_many({"_id": {"$in": ids}})
+
+    return len(ids)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default="gesture_app")
+    parser.add_argument("--collection", default="gesture_data")
+    parser.add_argument("--dtype", choices=sorted(PACKED_DTYPES), default="float32")
+    parser.add_argument("--chunk-size", type=int, default=4096)
+    parser.add_argument("--user-id")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    collection = get_mongo_client(args.mongo_uri)[args.db][args.collection]
+
+    match = {"features": {"$exists": True}}
+    if args.user_id:
+        match["user_id"] = args.user_id
+
+    groups = collection.aggregate([
+        {"$match": match},
+        {"$group": {"_id": {"user_id": "$user_id", "gesture": "$gesture"}}}
+    ])
+
+    total = 0
+    for group in groups:
+        user_id, gesture = group["_id"]["user_id"], group["_id"]["gesture"]
+        count = migrate_gesture(collection, user_id, gesture, args.dtype, args.chunk_size, args.dry_run)
+        print(f"{user_id} / {gesture}: {count} samples")
+        total += count
+
+    print(f"{'Would migrate' if args.dry_run else 'Migrated'} {total} samples")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,14 @@
 import io
+import os
+import time
 import numpy as np
 import torch
 import torch.nn as nn
-from torch.utils.data import Dataset, DataLoader
-from pymongo import MongoClient
 from datetime import datetime, timezone
+from pymongo import ReturnDocument
 
-
-# =========================
-# DATASET
-# =========================
-
-class HandLandmarkDataset(Dataset):
-    def __init__(self, samples, labels):
-        self.samples = samples
-        self.labels = labels
-
-    def __len__(self):
-        return len(self.samples)
-
-    def __getitem__(self, idx):
-        # Flatten to 63-dim vector
-        x = torch.tensor(self.samples[idx]).float().view(-1)
-        y = torch.tensor(self.labels[idx]).long()
-        return x, y
+from models.inference import fold_batchnorm, dump_numpy_model, predict_proba_batch
+from models.storage import get_collection, FEATURE_SIZE, unpack_samples
 
 
 # =========================
@@ -58,74 +43,376 @@ class LandmarkMLP(nn.Module):
 # LOAD USER DATA
 # =========================
 
-def load_user_data(collection, user_id):
+SAMPLE_PROJECTION = {
+    "_id": 1, "capture_id": 1, "gesture": 1, "features": 1, "features_packed": 1, "format": 1
+}
+LOAD_BATCH_SIZE = int(os.getenv("LOAD_BATCH_SIZE", "5000"))
+BATCH_COUNTER_COLLECTION = "gesture_batches"
+
+
+def claim_new_samples(collection, user_id):
+    # Tags every sample not yet seen by a retrain with the user's next batch
+    # number. Batch numbers come from a server-side counter and the tag is
+    # written by the database, so, unlike a cutoff on client-generated
+    # ObjectIds, a sample written during a retrain can't slip under it:
+    # it stays untagged until the next claim.
+    counter = collection.database[BATCH_COUNTER_COLLECTION].find_one_and_update(
+        {"_id": user_id},
+        {"$inc": {"batch": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    batch = counter["batch"]
+
+    collection.update_many(
+        {"user_id": user_id, "batch": {"$exists": False}},
+        {"$set": {"batch": batch}}
+    )
+    return batch
+
+
+def decode_samples(docs, class_to_idx, total=0):
+    # Streams documents into one preallocated (N, 63) array. groups numbers
+    # each sample's capture: a frame and its augmented copies share one, so
+    # validation can hold out whole captures. Documents from before
+    # capture_id was stored are their own capture.
+    capacity = max(total, 1)
+    samples = np.empty((capacity, FEATURE_SIZE), dtype=np.float32)
+    labels = np.empty(capacity, dtype=np.int64)
+    groups = np.empty(capacity, dtype=np.int64)
+    group_idx = {}
+    n = 0
+
+    for doc in docs:
+        if "features_packed" in doc:
+            x = unpack_samples(doc)
+        else:
+            x = np.asarray(doc["features"], dtype=np.float32).reshape(1, FEATURE_SIZE)
+
+        k = len(x)
+        if n + k > capacity:
+            # Packed documents, or samples written after the count; grow
+            capacity = max(capacity * 2, n + k)
+            samples = np.concatenate([samples[:n], np.empty((capacity - n, FEATURE_SIZE), np.float32)])
+            labels = np.concatenate([labels[:n], np.empty(capacity - n, np.int64)])
+            groups = np.concatenate([groups[:n], np.empty(capacity - n, np.int64)])
+
+        key = doc.get("capture_id", doc["_id"])
+        samples[n:n + k] = x
+        labels[n:n + k] = class_to_idx[doc["gesture"]]
+        groups[n:n + k] = group_idx.setdefault(key, len(group_idx))
+        n += k
+
+    return samples[:n], labels[:n], groups[:n]
+
+
+def load_user_data(collection, user_id, extra_query=None, gestures=None):
     query = {"user_id": user_id}
 
-    gestures = sorted(collection.distinct("gesture", query))
+    if gestures is None:
+        gestures = sorted(collection.distinct("gesture", query))
     class_to_idx = {g: i for i, g in enumerate(gestures)}
 
-    samples = []
-    labels = []
+    if extra_query:
+        query.update(extra_query)
+
+    # Document count is answered from the (user_id, _id) index without a
+    # fetch; packed documents hold more samples than that and
+    # decode_samples grows the arrays for them
+    total = collection.count_documents(query)
+    cursor = collection.find(query, SAMPLE_PROJECTION, batch_size=LOAD_BATCH_SIZE)
+
+    samples, labels, groups = decode_samples(cursor, class_to_idx, total)
+    return samples, labels, gestures, groups
+
+
+def sample_user_data(collection, user_id, size, gestures, extra_query=None):
+    # Random replay subset drawn server-side with $sample
+    match = {"user_id": user_id}
+    if extra_query:
+        match.update(extra_query)
 
-    for doc in collection.find(query):
-        samples.append(np.array(doc["features"], dtype=np.float32))
-        labels.append(class_to_idx[doc["gesture"]])
+    class_to_idx = {g: i for i, g in enumerate(gestures)}
+    docs = collection.aggregate([
+        {"$match": match},
+        {"$sample": {"size": size}},
+        {"$project": SAMPLE_PROJECTION}
+    ])
+    samples, labels, groups = decode_samples(docs, class_to_idx, size)
+
+    # Packed documents hold many samples each, so trim back to `size`
+    if len(samples) > size:
+        keep = np.random.choice(len(samples), size, replace=False)
+        samples, labels, groups = samples[keep], labels[keep], groups[keep]
 
-    return samples, labels, gestures
+    return samples, labels, groups
 
 
 # =========================
 # TRAIN MODEL
 # =========================
 
-def train_user_model(
-    mongo_uri,
-    db_name,
-    gesture_collection_name,
-    model_collection_name,
-    user_id,
-    batch_size=32,
-    epochs=25,
-    lr=0.001
-):
-    client = MongoClient(mongo_uri)
-    db = client[db_name]
+def grouped_split(labels, groups, val_fraction):
+    # Holds out whole captures, about val_fraction of each class, so no
+    # validation sample has a jittered copy in the training set. A class
+    # with a single capture stays entirely in training.
+    val = np.zeros(len(labels), dtype=bool)
 
-    gesture_collection = db[gesture_collection_name]
-    model_collection = db[model_collection_name]
+    for c in np.unique(labels):
+        in_class = labels == c
+        class_groups, sizes = np.unique(groups[in_class], return_counts=True)
+        if len(class_groups) < 2:
+            continue
 
-    samples, labels, classes = load_user_data(gesture_collection, user_id)
+        order = np.random.permutation(len(class_groups))
+        target = in_class.sum() * val_fraction
+        # Whole groups until the target is reached, never every group
+        k = min(int(np.searchsorted(np.cumsum(sizes[order]), target)) + 1, len(class_groups) - 1)
+        val |= in_class & np.isin(groups, class_groups[order[:k]])
 
-    if len(samples) == 0:
-        raise ValueError("No training data found for user.")
+    return np.flatnonzero(~val), np.flatnonzero(val)
 
-    dataset = HandLandmarkDataset(samples, labels)
-    loader = DataLoader(dataset, batch_size=batch_size, shuffle=True)
 
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    model = LandmarkMLP(len(classes)).to(device)
+def evaluate(model, X, y, criterion):
+    model.eval()
+    with torch.no_grad():
+        outputs = model(X)
+        loss = criterion(outputs, y).item()
+        accuracy = (outputs.argmax(dim=1) == y).float().mean().item()
+    return loss, accuracy
+
+
+def fit_model(
+    model,
+    samples,
+    labels,
+    device,
+    batch_size,
+    epochs,
+    lr,
+    progress=None,
+    val_fraction=0.15,
+    min_val_samples=20,
+    patience=4,
+    min_delta=1e-4,
+    max_seconds=None,
+    groups=None
+):
+    started = time.perf_counter()
+
+    # Whole dataset lives in two tensors on the device; batches are index
+    # slices of a fresh permutation each epoch instead of per-item collation
+    X = torch.from_numpy(np.ascontiguousarray(samples, dtype=np.float32)).view(-1, FEATURE_SIZE).to(device)
+    y = torch.from_numpy(np.ascontiguousarray(labels, dtype=np.int64)).to(device)
+
+    # Hold out a validation split for early stopping when there's enough
+    # data; with capture groups the split never separates a frame from its copies
+    if groups is not None:
+        train_idx, val_idx = grouped_split(np.asarray(labels), np.asarray(groups), val_fraction)
+    else:
+        split = np.random.permutation(len(X))
+        n_val = int(len(X) * val_fraction)
+        train_idx, val_idx = split[n_val:], split[:n_val]
+
+    n_val = len(val_idx)
+    if n_val >= min_val_samples:
+        val_idx = torch.from_numpy(val_idx).to(device)
+        train_idx = torch.from_numpy(train_idx).to(device)
+        X_val, y_val = X[val_idx], y[val_idx]
+        X, y = X[train_idx], y[train_idx]
+    else:
+        X_val = y_val = None
+
+    n = len(X)
 
     criterion = nn.CrossEntropyLoss()
     optimizer = torch.optim.Adam(model.parameters(), lr=lr)
 
+    best_loss = float("inf")
+    best_state = None
+    bad_epochs = 0
+    metrics = {"stopped_early": False, "val_samples": n_val if X_val is not None else 0}
+
     # Training loop
     for epoch in range(epochs):
         model.train()
         total_loss = 0
+        num_batches = 0
+
+        perm = torch.randperm(n, device=device)
 
-        for x, y in loader:
-            x, y = x.to(device), y.to(device)
+        for start in range(0, n, batch_size):
+            idx = perm[start:start + batch_size]
 
-            outputs = model(x)
-            loss = criterion(outputs, y)
+            # BatchNorm can't train on a single sample
+            if len(idx) < 2 and n > 1:
+                continue
 
-            optimizer.zero_grad()
+            outputs = model(X[idx])
+            loss = criterion(outputs, y[idx])
+
+            optimizer.zero_grad(set_to_none=True)
             loss.backward()
             optimizer.step()
 
             total_loss += loss.item()
+            num_batches += 1
+
+        epoch_loss = total_loss / max(num_batches, 1)
+        metrics["epochs_run"] = epoch + 1
+        metrics["train_loss"] = epoch_loss
+
+        if X_val is not None:
+            val_loss, val_accuracy = evaluate(model, X_val, y_val, criterion)
+            print(f"Epoch {epoch+1}/{epochs} Loss: {epoch_loss:.4f} "
+                  f"Val loss: {val_loss:.4f} Val acc: {val_accuracy:.3f}")
+
+            if val_loss < best_loss - min_delta:
+                best_loss = val_loss
+                best_state = {k: v.detach().clone() for k, v in model.state_dict().items()}
+                bad_epochs = 0
+                metrics.update(best_epoch=epoch + 1, val_loss=val_loss, val_accuracy=val_accuracy)
+            else:
+                bad_epochs += 1
+        else:
+            print(f"Epoch {epoch+1}/{epochs} Loss: {epoch_loss:.4f}")
+
+        if progress is not None:
+            progress(epoch + 1, epochs, epoch_loss)
+
+        if bad_epochs >= patience:
+            metrics["stopped_early"] = True
+            break
+
+        if max_seconds is not None and time.perf_counter() - started > max_seconds:
+            metrics["stopped_early"] = True
+            break
+
+    if best_state is not None:
+        model.load_state_dict(best_state)
+
+    metrics["duration_s"] = time.perf_counter() - started
+    return metrics
+
+
+def warm_start_model(checkpoint, classes, device):
+    # Reuses every layer of a stored model. Output rows are copied by class
+    # name, so added classes start fresh and removed ones are dropped.
+    old_classes = checkpoint["classes"]
+    state = checkpoint["model_state_dict"]
+
+    model = LandmarkMLP(len(classes)).to(device)
+
+    head_prefix = f"net.{len(model.net) - 1}."
+    body = {k: v for k, v in state.items() if not k.startswith(head_prefix)}
+    model.load_state_dict(body, strict=False)
+
+    head = model.net[-1]
+    old_idx = {c: i for i, c in enumerate(old_classes)}
+
+    with torch.no_grad():
+        for i, c in enumerate(classes):
+            j = old_idx.get(c)
+            if j is not None:
+                head.weight[i] = state[head_prefix + "weight"][j]
+                head.bias[i] = state[head_prefix + "bias"][j]
+
+    return model
 
-        print(f"Epoch {epoch+1}/{epochs} Loss: {total_loss/len(loader):.4f}")
+
+def train_user_model(
+    mongo_uri,
+    db_name,
+    gesture_collection_name,
+    model_collection_name,
+    user_id,
+    batch_size=32,
+    epochs=25,
+    lr=0.001,
+    client=None,
+    gesture_collection=None,
+    model_collection=None,
+    progress=None,
+    incremental=False,
+    finetune_epochs=8,
+    finetune_lr=0.0005,
+    replay_ratio=2.0,
+    min_replay=256,
+    val_fraction=0.15,
+    patience=4,
+    max_seconds=None,
+    return_metrics=False
+):
+    if gesture_collection is None:
+        gesture_collection = get_collection(mongo_uri, db_name, gesture_collection_name, client)
+    if model_collection is None:
+        model_collection = get_collection(mongo_uri, db_name, model_collection_name, client)
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+    # Samples written after this point belong to the next retrain
+    data_batch = claim_new_samples(gesture_collection, user_id)
+
+    stored = None
+    if incremental:
+        stored = model_collection.find_one({"user_id": user_id})
+        if stored is not None and "data_batch" not in stored:
+            stored = None
+
+    if stored is not None:
+        classes = sorted(gesture_collection.distinct("gesture", {"user_id": user_id}))
+        if not classes:
+            raise ValueError("No training data found for user.")
+
+        checkpoint = torch.load(io.BytesIO(stored["model_binary"]), map_location=device)
+        # Batches after the stored one, including any whose retrain failed
+        previous_batch = stored["data_batch"]
+
+        new_samples, new_labels, _, new_groups = load_user_data(
+            gesture_collection, user_id,
+            {"batch": {"$gt": previous_batch, "$lte": data_batch}}, classes
+        )
+
+        if len(new_samples) == 0 and classes == checkpoint["classes"]:
+            model = warm_start_model(checkpoint, classes, device)
+            model.eval()
+            if return_metrics:
+                return model, classes, stored.get("metrics", {})
+            return model, classes
+
+        # Fine-tune on what changed plus a replay of older data so
+        # existing classes aren't forgotten
+        replay_size = max(min_replay, int(len(new_samples) * replay_ratio))
+        replay_samples, replay_labels, replay_groups = sample_user_data(
+            gesture_collection, user_id, replay_size, classes,
+            {"batch": {"$lte": previous_batch}}
+        )
+
+        samples = np.concatenate([new_samples, replay_samples])
+        labels = np.concatenate([new_labels, replay_labels])
+        # Group numbers are per load; shift the replay's past the new ones
+        groups = np.concatenate([new_groups, replay_groups + len(new_groups)])
+
+        model = warm_start_model(checkpoint, classes, device)
+        epochs, lr = finetune_epochs, finetune_lr
+    else:
+        samples, labels, classes, groups = load_user_data(
+            gesture_collection, user_id, {"batch": {"$lte": data_batch}}
+        )
+        model = LandmarkMLP(len(classes)).to(device)
+
+    if len(samples) == 0:
+        raise ValueError("No training data found for user.")
+
+    metrics = fit_model(
+        model, samples, labels, device, batch_size, epochs, lr, progress,
+        val_fraction=val_fraction,
+        patience=patience,
+        max_seconds=max_seconds,
+        groups=groups
+    )
+    metrics["incremental"] = stored is not None
+    metrics["samples"] = len(samples)
 
     # Save model to Mongo
     buffer = io.BytesIO()
@@ -140,23 +427,73 @@ def train_user_model(
         {
             "$set": {
                 "model_binary": buffer.read(),
+                "inference_binary": export_numpy_model(model, classes),
+                "data_batch": data_batch,
+                "metrics": metrics,
                 "updated_at": datetime.now(timezone.utc)
-            }
+            },
+            "$unset": {"data_cutoff": ""}
         },
         upsert=True
     )
 
+    if return_metrics:
+        return model, classes, metrics
     return model, classes
 
 
+def limit_threads(num_threads):
+    # Keeps a retrain worker process from spreading over every core
+    torch.set_num_threads(max(1, num_threads))
+
+
+def retrain_job(user_id, progress=None, **kwargs):
+    # Entry point for retrain worker processes; returns only picklable results
+    _, classes, metrics = train_user_model(
+        user_id=user_id, progress=progress, return_metrics=True, **kwargs
+    )
+    return classes, metrics
+
+
+# =========================
+# EXPORT
+# =========================
+
+def export_numpy_model(model, classes):
+    weights = []
+    biases = []
+
+    for layer in model.net:
+        if isinstance(layer, nn.Linear):
+            weights.append(layer.weight.detach().cpu().numpy().astype(np.float64))
+            biases.append(layer.bias.detach().cpu().numpy().astype(np.float64))
+        elif isinstance(layer, nn.BatchNorm1d):
+            weights[-1], biases[-1] = fold_batchnorm(
+                weights[-1], biases[-1],
+                layer.weight.detach().cpu().numpy(),
+                layer.bias.detach().cpu().numpy(),
+                layer.running_mean.cpu().numpy(),
+                layer.running_var.cpu().numpy(),
+                layer.eps
+            )
+
+    return dump_numpy_model([w.T for w in weights], biases, classes)
+
+
 # =========================
 # LOAD MODEL
 # =========================
 
-def load_user_model(mongo_uri, db_name, model_collection_name, user_id):
-    client = MongoClient(mongo_uri)
-    db = client[db_name]
-    model_collection = db[model_collection_name]
+def load_user_model(
+    mongo_uri,
+    db_name,
+    model_collection_name,
+    user_id,
+    client=None,
+    model_collection=None
+):
+    if model_collection is None:
+        model_collection = get_collection(mongo_uri, db_name, model_collection_name, client)
 
     doc = model_collection.find_one({"user_id": user_id})
     if not doc:
@@ -180,14 +517,10 @@ def load_user_model(mongo_uri, db_name, model_collection_name, user_id):
 # PREDICT
 # =========================
 
-def predict(model, classes, feature_array):
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-
-    x = torch.tensor(feature_array).float().view(1, -1).to(device)
+def predict_batch(model, classes, feature_arrays):
+    pred_idx = predict_proba_batch(model, feature_arrays).argmax(axis=1).tolist()
+    return [classes[i] for i in pred_idx]
 
-    with torch.no_grad():
-        outputs = model(x)
-        probs = torch.softmax(outputs, dim=1)
-        pred_idx = torch.argmax(probs, dim=1).item()
 
-    return classes[pred_idx]
+def predict(model, classes, feature_array):
+    return predict_batch(model, classes, [feature_array])[0]
@@ -0,0 +1,73 @@
+import os
+import threading
+
+import numpy as np
+from pymongo import MongoClient
+
+
+# Mongo access and the gesture_data sample encoding, shared by training and
+# the server. Nothing here imports torch, so the serving process doesn't
+# have to either.
+
+# =========================
+# MONGO CLIENT
+# =========================
+
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_mongo_client(mongo_uri):
+    # One pooled client per URI for the whole process
+    with _clients_lock:
+        client = _clients.get(mongo_uri)
+        if client is None:
+            if mongo_uri.startswith("mongomock://"):
+                # In-memory stand-in for benchmarks and replays
+                import mongomock
+                client = mongomock.MongoClient()
+            else:
+                client = MongoClient(
+                    mongo_uri,
+                    maxPoolSize=MONGO_MAX_POOL_SIZE,
+                    minPoolSize=MONGO_MIN_POOL_SIZE
+                )
+            _clients[mongo_uri] = client
+        return client
+
+
+def get_collection(mongo_uri, db_name, collection_name, client=None):
+    if client is None:
+        client = get_mongo_client(mongo_uri)
+    return client[db_name][collection_name]
+
+
+# =========================
+# PACKED STORAGE
+# =========================
+
+FEATURE_SIZE = 63
+
+# gesture_data documents either hold one sample as a nested "features" list
+# or many samples as little-endian "features_packed" bytes of this dtype
+PACKED_DTYPES = {
+    "float16": "<f2",
+    "float32": "<f4",
+}
+
+
+def pack_samples(samples, dtype="float32"):
+    arr = np.asarray(samples, dtype=PACKED_DTYPES[dtype]).reshape(-1, FEATURE_SIZE)
+    return {
+        "format": dtype,
+        "count": len(arr),
+        "features_packed": arr.tobytes()
+    }
+
+
+def unpack_samples(doc):
+    arr = np.frombuffer(doc["features_packed"], PACKED_DTYPES[doc["format"]])
+    return arr.reshape(-1, FEATURE_SIZE)
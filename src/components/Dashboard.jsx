@@ -24,10 +24,10 @@ export default function Dashboard() {
   const [progress, setProgress] = useState(0);
   const [trainingProgress, setTrainingProgress] = useState(0);
   const [trainingMessage, setTrainingMessage] = useState("");
-  const trainingIntervalRef = useRef(null);
   const webcamRef = useRef(null);
   const wsRef = useRef(null);
   const predictionIntervalRef = useRef(null);
+  const frameIntervalRef = useRef(300);
 
   const token = localStorage.getItem("token");
 
@@ -63,7 +63,7 @@ export default function Dashboard() {
     setCurrentStep(0);
     setProgress(0);
 
-    if (predictionIntervalRef.current) clearInterval(predictionIntervalRef.current);
+    if (predictionIntervalRef.current) clearTimeout(predictionIntervalRef.current);
     if (wsRef.current) {
       wsRef.current.close();
       wsRef.current = null;
@@ -143,7 +143,7 @@ export default function Dashboard() {
     wsRef.current = ws;
 
     ws.onopen = () => {
-      ws.send(JSON.stringify({ token }));
+      ws.send(JSON.stringify({ token, frame_format: "encoded" }));
       setCameraMode("predict");
       setIsConnecting(false);
       setStatusText("Live prediction running...");
@@ -152,6 +152,8 @@ export default function Dashboard() {
     ws.onmessage = (event) => {
       const data = JSON.parse(event.data);
       if (data.prediction) setStatusText(`Prediction: ${data.prediction}`);
+      // Server recommends a send interval from its measured latency
+      if (data.interval_ms) frameIntervalRef.current = data.interval_ms;
     };
 
     ws.onerror = () => {
@@ -162,14 +164,21 @@ export default function Dashboard() {
 
   useEffect(() => {
     if (cameraMode === "predict" && wsRef.current) {
-      predictionIntervalRef.current = setInterval(() => {
+      const sendFrame = () => {
         if (webcamRef.current && wsRef.current?.readyState === 1) {
-          const frame = webcamRef.current.getScreenshot();
-          if (frame) wsRef.current.send(JSON.stringify({ frame }));
+          // Send raw JPEG bytes as a binary message instead of a base64 data URL
+          const canvas = webcamRef.current.getCanvas();
+          if (canvas) {
+            canvas.toBlob((blob) => {
+              if (blob && wsRef.current?.readyState === 1) wsRef.current.send(blob);
+            }, "image/jpeg", 0.92);
+          }
         }
-      }, 300);
+        predictionIntervalRef.current = setTimeout(sendFrame, frameIntervalRef.current);
+      };
+      sendFrame();
     }
-    return () => clearInterval(predictionIntervalRef.current);
+    return () => clearTimeout(predictionIntervalRef.current);
   }, [cameraMode]);
 
   const retrainModel = async () => {
@@ -178,23 +187,33 @@ export default function Dashboard() {
       setTrainingProgress(5);
       setTrainingMessage("Initializing training pipeline...");
 
-      // Smooth fake progress animation
-      trainingIntervalRef.current = setInterval(() => {
-        setTrainingProgress(prev => {
-          if (prev >= 90) return prev; // Stop at 90% until backend finishes
-          return prev + Math.random() * 5;
-        });
-      }, 500);
-
       const res = await fetch("http://127.0.0.1:8000/retrain_model", {
         method: "POST",
         headers: { Authorization: `Bearer ${token}` }
       });
 
-      const data = await res.json();
-      if (!res.ok) throw new Error(data.detail);
+      let job = await res.json();
+      if (!res.ok) throw new Error(job.detail);
+
+      // Training runs as a background job; poll its status for real progress
+      while (job.status === "queued" || job.status === "running") {
+        await new Promise(r => setTimeout(r, 500));
+
+        const statusRes = await fetch(`http://127.0.0.1:8000/retrain_status/${job.job_id}`, {
+          headers: { Authorization: `Bearer ${token}` }
+        });
+        job = await statusRes.json();
+        if (!statusRes.ok) throw new Error(job.detail);
+
+        if (job.status === "queued") {
+          setTrainingMessage("Waiting for a training slot...");
+        } else if (job.epochs) {
+          setTrainingMessage(`Epoch ${job.epoch}/${job.epochs} · loss ${job.loss?.toFixed(4)}`);
+          setTrainingProgress(Math.max(5, Math.round((job.epoch / job.epochs) * 95)));
+        }
+      }
 
-      clearInterval(trainingIntervalRef.current);
+      if (job.status === "failed") throw new Error(job.error || "Training failed");
 
       setTrainingMessage("Finalizing model...");
       setTrainingProgress(100);
@@ -205,7 +224,6 @@ export default function Dashboard() {
       }, 800);
 
     } catch (err) {
-      clearInterval(trainingIntervalRef.current);
       alert(err.message);
     } finally {
       setTimeout(() => {